@@ -0,0 +1,161 @@
+"""
+Repeated runs of the same configuration, aggregated.
+
+Runs are grouped by their configuration columns (every key column of the
+store except the folder), and each group gets the count, mean and sample
+variance of a metric plus the half width of its 95% confidence interval.
+Speedups are taken between group means, against the group with the
+baseline branch predictor and cache size that has the same benchmark,
+matrix and loop unrolling, and their confidence interval comes from the
+variances of both means (delta method). For metrics and stats that are
+in neither LOWER_IS_BETTER nor HIGHER_IS_BETTER, like most raw stats,
+which way is faster is not known, so only the difference of the means is
+given unless the caller says. Everything is computed for all
+groups at once with np.unique and np.bincount.
+
+Run directories with the same content are one run: result cache hits and
+--search waves link the files of an earlier run into a new directory, and
+counting those as replicates would give a variance of 0 and a confidence
+interval of +-0. Given the content hashes of the runs, only the first of
+each is counted.
+"""
+import numpy as np
+
+import results_store
+from sampling import T_95
+
+CONFIG_COLUMNS = [name for name in results_store.KEY_COLUMNS if name != 'folder']
+# runs compared by a speedup share these columns
+FAMILY_COLUMNS = ['Benchmark', 'M_I', 'M_J', 'M_K', 'LOOP_UNROLLING']
+# metrics where smaller is faster, their speedup is baseline / value
+LOWER_IS_BETTER = ['sim_ticks', 'sim_seconds', 'cpi', 'branch_miss_rate', 'branch_mpki',
+                   'system.cpu.numCycles', 'system.cpu.cpi']
+# metrics where larger is faster, their speedup is value / baseline
+HIGHER_IS_BETTER = ['ipc', 'system.cpu.ipc', 'speedup', 'bp_predicted_per_incorrect',
+                    'page_hit_rate']
+
+def t_95(df):
+    """Two-sided 95% Student t critical value for each degrees of freedom
+    in df (NaN below 1)."""
+    df = np.asarray(df)
+    table = np.array(T_95)
+    t = np.where(df > len(table), 1.96, table[np.clip(df, 1, len(table)) - 1])
+    return np.where(df >= 1, t, np.nan)
+
+def group_runs(table, columns=CONFIG_COLUMNS):
+    """(keys, inverse): one row of column values per group, and the group
+    of every run."""
+    keys = np.stack([np.asarray(table[name], dtype=np.int64) for name in columns], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return groups, inverse.reshape(-1)
+
+def distinct_runs(hashes):
+    """True for the first row of every content hash and for the rows
+    whose hash is not known ('')."""
+    hashes = np.asarray(hashes, dtype=object)
+    keep = hashes == ''
+    unique, first = np.unique(hashes, return_index=True)
+    keep[first] = True
+    return keep
+
+def summarize(values, inverse, n_groups):
+    """count, mean and sample variance of values per group, skipping NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    values = np.where(valid, values, 0.0)
+    count = np.bincount(inverse, weights=valid, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(inverse, weights=values, minlength=n_groups) / count
+        deviation = np.where(valid, values - mean[inverse], 0.0)
+        var = np.bincount(inverse, weights=deviation ** 2, minlength=n_groups) / (count - 1)
+    var[count < 2] = np.nan
+    return count.astype(np.int64), mean, var
+
+class Comparison(object):
+    """
+    Aggregated metric per configuration group. Arrays are indexed by
+    group; keys[:, i] holds CONFIG_COLUMNS[i] (category codes for the
+    category columns).
+    """
+    def __init__(self, data, name, baseline, lower_is_better=None, hashes=None):
+        """data: metrics.DerivedMetrics; name: metric or stat to compare;
+        baseline: {column: value} picking the baseline groups. With
+        lower_is_better (by default for the LOWER_IS_BETTER metrics) the
+        speedup is baseline / value, with lower_is_better False (by default
+        for HIGHER_IS_BETTER) value / baseline; otherwise speedup is NaN and
+        only delta, value - baseline, is given. hashes: content hash of
+        every run (results_store.run_hashes), to count copies of a run
+        once."""
+        if lower_is_better is None and name in LOWER_IS_BETTER:
+            lower_is_better = True
+        elif lower_is_better is None and name in HIGHER_IS_BETTER:
+            lower_is_better = False
+        self.lower_is_better = lower_is_better
+        table = data.table
+        self.table = table
+        self.name = name
+        self.keys, inverse = group_runs(table)
+        n = len(self.keys)
+        values = data[name]
+        if hashes is not None:
+            values = np.where(distinct_runs(hashes), values, np.nan)
+        self.count, self.mean, self.var = summarize(values, inverse, n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.ci95 = t_95(self.count - 1) * np.sqrt(self.var / self.count)
+        self._speedup(baseline, lower_is_better)
+
+    def column(self, name):
+        values = self.keys[:, CONFIG_COLUMNS.index(name)]
+        if name in self.table.categories:
+            return np.asarray(self.table.categories[name])[values]
+        return values
+
+    def _speedup(self, baseline, lower_is_better):
+        n = len(self.keys)
+        is_baseline = np.ones(n, dtype=bool)
+        for name, value in baseline.items():
+            if name in self.table.categories:
+                value = self.table.code(name, value)
+            is_baseline &= self.keys[:, CONFIG_COLUMNS.index(name)] == value
+        family_columns = [CONFIG_COLUMNS.index(name) for name in FAMILY_COLUMNS]
+        families, family = np.unique(self.keys[:, family_columns], axis=0, return_inverse=True)
+        family = family.reshape(-1)
+        # baseline group of every family, -1 if it was never simulated
+        base_of_family = np.full(len(families), -1)
+        base_of_family[family[is_baseline]] = np.flatnonzero(is_baseline)
+        base = base_of_family[family]
+        has_base = base >= 0
+        base = np.where(has_base, base, 0)
+        mean_b, var_b, count_b = self.mean[base], self.var[base], self.count[base]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df = np.minimum(self.count, count_b) - 1
+            delta = self.mean - mean_b
+            self.delta = np.where(has_base, delta, np.nan)
+            self.delta_ci95 = np.where(has_base,
+                                       t_95(df) * np.sqrt(self.var / self.count +
+                                                          var_b / count_b),
+                                       np.nan)
+            if lower_is_better:
+                ratio = mean_b / self.mean
+            else:
+                ratio = self.mean / mean_b
+            relative_var = (self.var / (self.count * self.mean ** 2) +
+                            var_b / (count_b * mean_b ** 2))
+            known = has_base & (lower_is_better is not None)
+            self.speedup = np.where(known, ratio, np.nan)
+            self.speedup_ci95 = np.where(known,
+                                         np.abs(ratio) * t_95(df) * np.sqrt(relative_var),
+                                         np.nan)
+        self.baseline = np.where(has_base, base, -1)
+
+    def rows(self):
+        """One dict per group, for reports."""
+        columns = {name: self.column(name) for name in CONFIG_COLUMNS}
+        for g in range(len(self.keys)):
+            row = {name: columns[name][g].item() for name in CONFIG_COLUMNS}
+            row.update(count=int(self.count[g]), mean=float(self.mean[g]),
+                       var=float(self.var[g]), ci95=float(self.ci95[g]),
+                       speedup=float(self.speedup[g]),
+                       speedup_ci95=float(self.speedup_ci95[g]),
+                       delta=float(self.delta[g]), delta_ci95=float(self.delta_ci95[g]))
+            yield row
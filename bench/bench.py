@@ -0,0 +1,235 @@
+"""
+Throughput benchmarks of the sweep and analysis tooling.
+
+    python3 bench/bench.py sweep [--runs 64] [--jobs 1] [--simulate 0.05]
+    python3 bench/bench.py analysis [--dirs 100,1000,10000] [--compact]
+    python3 bench/bench.py all --save bench.json
+    python3 bench/bench.py all --baseline bench.json
+
+sweep runs gem5script.py --test on a sweep of --runs jobs with the stub m5
+of bench/stub, where every simulation takes --instantiate + --simulate
+seconds, and reports jobs/s of run_all_simulations plus the time each job
+spent outside the stub (forking, journal, result cache, ...). It then runs
+the same sweep again with --restart_test, where every job is a result
+cache hit.
+
+analysis writes a synthetic tree of each size with bench/synth.py and
+reports directories/s of a cold ingest, of an ingest where nothing
+changed, and of rendering the report figures from the store.
+
+--save writes the results as JSON. --baseline compares them with a saved
+run and exits with status 1 when a rate dropped by more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH)
+STUB = os.path.join(BENCH, 'stub')
+sys.path.insert(0, REPO)
+
+import synth
+
+class Result(object):
+    def __init__(self, name, size, seconds, unit, note=''):
+        self.name = name
+        self.size = size
+        self.seconds = seconds
+        self.unit = unit
+        self.note = note
+
+    @property
+    def rate(self):
+        return self.size / self.seconds if self.seconds else float('inf')
+
+    @property
+    def key(self):
+        return '%s/%d' % (self.name, self.size)
+
+    def as_dict(self):
+        return {'name': self.name, 'size': self.size, 'seconds': self.seconds,
+                'rate': self.rate, 'unit': self.unit}
+
+def best_of(repeat, function):
+    """Shortest time of repeat calls of function; it returns its time."""
+    return min(function() for i in range(repeat))
+
+def sweep_spec(runs):
+    """Sweep of runs jobs over the configurations of synth, one job per
+    point; past 192 jobs the points get an extra argument so that every
+    key is different."""
+    configs = synth.configurations()
+    points = []
+    for n in range(runs):
+        benchmark, predictor, cache_kb, matrix = configs[n % len(configs)]
+        arguments = '%d %d %d' % matrix
+        if n >= len(configs):
+            arguments += ' %d' % (n // len(configs))
+        points.append({'cmd': os.path.join(REPO, benchmark), 'branch_predictor': predictor[0],
+                       'l1d_size': '%dkB' % cache_kb, 'options': arguments})
+    return {'axes': {'point': points}}
+
+def stub_environment(args):
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join([STUB, BENCH, REPO]),
+               BENCH_M5_INSTANTIATE=str(args.instantiate),
+               BENCH_M5_SIMULATE=str(args.simulate),
+               BENCH_M5_DUMP=str(args.dump))
+    return env
+
+def run_sweep(workdir, args, extra=()):
+    command = [sys.executable, os.path.join(REPO, 'gem5script.py'),
+               '--directory=' + os.path.join(workdir, 'out'),
+               '--test=' + os.path.join(workdir, 'spec.json'),
+               '--jobs=%d' % args.jobs] + list(extra)
+    with open(os.path.join(workdir, 'sweep.log'), 'a') as log:
+        start = time.perf_counter()
+        status = subprocess.call(command, cwd=workdir, env=stub_environment(args),
+                                 stdout=log, stderr=subprocess.STDOUT)
+        seconds = time.perf_counter() - start
+    if status:
+        sys.exit("gem5script.py failed, see " + os.path.join(workdir, 'sweep.log'))
+    return seconds
+
+def bench_sweep(workdir, args):
+    results = []
+    def fresh():
+        directory = os.path.join(workdir, 'sweep')
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'spec.json'), 'w') as f:
+            json.dump(sweep_spec(args.runs), f)
+        return run_sweep(directory, args)
+    seconds = best_of(args.repeat, fresh)
+    note = 'jobs=%d' % args.jobs
+    if args.jobs == 1:
+        overhead = seconds / args.runs - (args.instantiate + args.simulate + args.dump)
+        note += ', %.1f ms/job outside the stub' % (overhead * 1000)
+    results.append(Result('sweep', args.runs, seconds, 'jobs/s', note))
+    # the result cache of the last fresh sweep has every job
+    cached = lambda: run_sweep(os.path.join(workdir, 'sweep'), args, ['--restart_test'])
+    results.append(Result('sweep_cached', args.runs, best_of(args.repeat, cached), 'jobs/s',
+                          'every job a result cache hit'))
+    return results
+
+def bench_analysis(workdir, args):
+    import gem5_analyser
+    import render
+    baseline = {'BP': gem5_analyser.BP_BASELINE, 'CacheSize': gem5_analyser.CACHE_SIZE_BASELINE}
+    template = synth.RunTemplate(args.template)
+    results = []
+    cwd = os.getcwd()
+    for size in args.dirs:
+        directory = os.path.join(workdir, 'analysis-%d' % size)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        rootdir = os.path.join(directory, 'output_final')
+        storedir = os.path.join(directory, 'results_store')
+        synth.generate(rootdir, size, template, compact=args.compact)
+        os.chdir(directory)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                def ingest(cold):
+                    if cold:
+                        shutil.rmtree(storedir, ignore_errors=True)
+                    start = time.perf_counter()
+                    gem5_analyser.ingest(rootdir, storedir)
+                    return time.perf_counter() - start
+                results.append(Result('ingest_cold', size,
+                                      best_of(args.repeat, lambda: ingest(True)), 'dirs/s'))
+                results.append(Result('ingest_warm', size,
+                                      best_of(args.repeat, lambda: ingest(False)), 'dirs/s',
+                                      'nothing changed'))
+                def plot():
+                    start = time.perf_counter()
+                    render.render_all(gem5_analyser.reportSpecs(), storedir, baseline,
+                                      args.render_workers)
+                    return time.perf_counter() - start
+                results.append(Result('plot', size, best_of(args.repeat, plot), 'dirs/s',
+                                      'report figures'))
+        finally:
+            os.chdir(cwd)
+    return results
+
+def print_results(results, baseline=None):
+    print('%-14s %8s %10s %14s  %s' % ('benchmark', 'size', 'seconds', 'rate', ''))
+    for result in results:
+        line = '%-14s %8d %10.3f %9.1f %-6s' % (result.name, result.size, result.seconds,
+                                               result.rate, result.unit)
+        if baseline and result.key in baseline:
+            line += '  %+6.1f%%' % (100 * (result.rate / baseline[result.key] - 1))
+        print(line + ('  ' + result.note if result.note else ''))
+
+def regressions(results, baseline, tolerance):
+    return [result for result in results
+            if result.key in baseline and result.rate < baseline[result.key] * (1 - tolerance)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the sweep and analysis tooling")
+    parser.add_argument('what', choices=['sweep', 'analysis', 'all'])
+    parser.add_argument('--runs', type=int, default=64, help="jobs of the sweep")
+    parser.add_argument('--jobs', type=int, default=1, help="--jobs of gem5script.py")
+    parser.add_argument('--instantiate', type=float, default=0.01,
+                        help="seconds of m5.instantiate() in the stub")
+    parser.add_argument('--simulate', type=float, default=0.05,
+                        help="seconds the stub takes to simulate a whole program")
+    parser.add_argument('--dump', type=float, default=0.0,
+                        help="extra seconds of every m5.stats.dump() in the stub")
+    parser.add_argument('--dirs', default='100,1000',
+                        help="sizes of the synthetic trees, comma separated")
+    parser.add_argument('--compact', action='store_true',
+                        help="small synthetic stats.txt/config.ini, for trees of 10^5 runs")
+    parser.add_argument('--template', default=None,
+                        help="run the synthetic trees are copied from (first run of output_final)")
+    parser.add_argument('--render-workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1, help="keep the best of this many runs")
+    parser.add_argument('--workdir', default=None,
+                        help="where to run (a temporary directory, removed at the end)")
+    parser.add_argument('--save', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare with results saved by --save")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="relative drop of a rate that counts as a regression")
+    args = parser.parse_args()
+    args.dirs = [int(size) for size in args.dirs.split(',') if size]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='gem5-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    try:
+        if args.what in ['sweep', 'all']:
+            results += bench_sweep(workdir, args)
+        if args.what in ['analysis', 'all']:
+            results += bench_analysis(workdir, args)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {'%s/%d' % (r['name'], r['size']): r['rate'] for r in json.load(f)['results']}
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'settings': {name: value for name, value in vars(args).items()
+                                    if name not in ['save', 'baseline']},
+                       'results': [result.as_dict() for result in results]}, f, indent=1)
+    if baseline:
+        slower = regressions(results, baseline, args.tolerance)
+        for result in slower:
+            print("regression: %s %.1f %s, was %.1f" % (result.key, result.rate, result.unit,
+                                                         baseline[result.key]))
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
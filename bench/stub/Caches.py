@@ -0,0 +1,8 @@
+"""Stand-in for gem5's configs/common/Caches.py (see m5/__init__.py)."""
+from m5.objects import SimObject
+
+class L1_ICache(SimObject):
+    pass
+
+class L1_DCache(SimObject):
+    pass
@@ -0,0 +1,4 @@
+"""Stand-in for gem5's configs/common/MemConfig.py (see m5/__init__.py)."""
+
+def config_mem(options, system):
+    pass
@@ -0,0 +1,43 @@
+"""
+Stand-in for gem5's configs/common/Options.py (see m5/__init__.py): the
+options of addCommonOptions and addSEOptions that gem5script.py and
+result_cache.py use, with gem5's defaults.
+"""
+
+def addCommonOptions(parser):
+    parser.add_option("--num-cpus", type="int", default=1, dest="num_cpus")
+    parser.add_option("--sys-voltage", type="string", default="1.0V", dest="sys_voltage")
+    parser.add_option("--sys-clock", type="string", default="1GHz", dest="sys_clock")
+    parser.add_option("--cpu-clock", type="string", default="2GHz", dest="cpu_clock")
+    parser.add_option("--mem-type", type="string", default="DDR3_1600_8x8", dest="mem_type")
+    parser.add_option("--mem-channels", type="int", default=1, dest="mem_channels")
+    parser.add_option("--mem-ranks", type="int", default=None, dest="mem_ranks")
+    parser.add_option("--mem-size", type="string", default="512MB", dest="mem_size")
+    parser.add_option("--caches", action="store_true")
+    parser.add_option("--l2cache", action="store_true")
+    parser.add_option("--l1d_size", type="string", default="64kB")
+    parser.add_option("--l1i_size", type="string", default="32kB")
+    parser.add_option("--l1d_assoc", type="int", default=2)
+    parser.add_option("--l1i_assoc", type="int", default=2)
+    parser.add_option("--cacheline_size", type="int", default=64)
+    parser.add_option("--abs-max-tick", type="int", default=2 ** 64 - 1, dest="abs_max_tick")
+    parser.add_option("--rel-max-tick", type="int", default=None, dest="rel_max_tick")
+    parser.add_option("--maxtime", type="float", default=None)
+    parser.add_option("--prog-interval", type="str", dest="prog_interval")
+    parser.add_option("--checkpoint-dir", type="string", default=None, dest="checkpoint_dir")
+    parser.add_option("-F", "--fast-forward", type="string", default=None, dest="fast_forward")
+    parser.add_option("--take-checkpoints", action="store", type="string",
+                      dest="take_checkpoints")
+    parser.add_option("--standard-switch", action="store", type="int", default=None,
+                      dest="standard_switch")
+    parser.add_option("--repeat-switch", action="store", type="int", default=None,
+                      dest="repeat_switch")
+    parser.add_option("-I", "--maxinsts", action="store", type="int", default=None)
+
+def addSEOptions(parser):
+    parser.add_option("-c", "--cmd", default="")
+    parser.add_option("-o", "--options", default="")
+    parser.add_option("-i", "--input", default="")
+    parser.add_option("--output", default="")
+    parser.add_option("--errout", default="")
+    parser.add_option("--smt", action="store_true", default=False)
@@ -0,0 +1,147 @@
+"""
+Stand-in for gem5's m5 module, to run gem5script.py under plain python3
+and measure the sweep machinery around the simulator (see bench/bench.py):
+
+    PYTHONPATH=bench/stub:bench:. python3 gem5script.py --directory=out ...
+
+Nothing is simulated. The program "runs" for BENCH_M5_TICKS ticks at
+BENCH_M5_IPC instructions per cycle, and m5.simulate() sleeps in
+proportion to the ticks it covers, so the whole program takes
+BENCH_M5_SIMULATE seconds. simulate() stops where gem5 would: at the end
+of the program, at the tick limit it is given, or at an instruction stop
+(scheduleInstStop, max_insts_any_thread), with gem5's exit causes.
+m5.instantiate() sleeps BENCH_M5_INSTANTIATE seconds and writes
+config.ini, and m5.stats.dump() appends a stats block; both are copies of
+the template run of bench/synth.py with the configuration of the system
+and the counters of the simulation filled in.
+
+Environment (times in seconds):
+    BENCH_M5_INSTANTIATE  0.01
+    BENCH_M5_SIMULATE     0.05
+    BENCH_M5_DUMP         0       extra time of every stats dump
+    BENCH_M5_TICKS        10**9   length of the program
+    BENCH_M5_IPC          1.0
+    BENCH_M5_EXIT_CODE    0       exit code of the program
+"""
+import math
+import os
+import time
+
+import synth
+
+from . import core, defines, objects, stats, util
+
+MaxTick = 2 ** 64 - 1
+EXIT_CAUSE = "exiting with last active thread context"
+LIMIT_CAUSE = "simulate() limit reached"
+MAX_INSTS_CAUSE = "a thread reached the max instruction count"
+
+class Options(object):
+    outdir = 'm5out'
+
+options = Options()
+
+def _env(name, default):
+    return type(default)(os.environ.get(name, default))
+
+class ExitEvent(object):
+    def __init__(self, cause, code=0):
+        self.cause = cause
+        self.code = code
+
+    def getCause(self):
+        return self.cause
+
+    def getCode(self):
+        return self.code
+
+class State(object):
+    """Simulated time of the process."""
+    def __init__(self):
+        self.instantiate_s = _env('BENCH_M5_INSTANTIATE', 0.01)
+        self.simulate_s = _env('BENCH_M5_SIMULATE', 0.05)
+        self.program_ticks = _env('BENCH_M5_TICKS', 10 ** 9)
+        self.ipc = _env('BENCH_M5_IPC', 1.0)
+        self.exit_code = _env('BENCH_M5_EXIT_CODE', 0)
+        # loaded before the sweep forks, so every simulation shares it
+        self.template = synth.RunTemplate(os.environ.get('BENCH_M5_TEMPLATE'))
+        self.root = None
+        self.active = []
+        self.tick = 0
+        self.reset()
+
+    def reset(self):
+        self.reset_tick = self.tick
+        self.reset_insts = self.insts()
+
+    def insts(self):
+        return sum(cpu.insts for cpu in self.all_cpus())
+
+    def all_cpus(self):
+        if self.root is None:
+            return []
+        system = self.root.system
+        return list(system.cpu or []) + list(system.switch_cpus or [])
+
+    def ticks_for(self, insts):
+        return int(math.ceil(insts / self.ipc * synth.TICKS_PER_CYCLE))
+
+    def insts_for(self, ticks):
+        return int(ticks / synth.TICKS_PER_CYCLE * self.ipc)
+
+    def stats(self):
+        ticks = self.tick - self.reset_tick
+        insts = self.insts() - self.reset_insts
+        cycles = ticks // synth.TICKS_PER_CYCLE
+        values = {'sim_ticks': ticks, 'final_tick': self.tick,
+                  'sim_seconds': ticks / 1e12, 'sim_insts': insts,
+                  'system.cpu.committedInsts': insts, 'system.cpu.numCycles': cycles,
+                  'system.cpu.ipc': insts / cycles if cycles else 0.0,
+                  'system.cpu.cpi': cycles / insts if insts else 0.0}
+        return {name: value for name, value in values.items()
+                if name in self.template.stat_index}
+
+    def config(self):
+        cpu = self.root.system.cpu[0]
+        predictor = cpu.branchPred
+        dcache_size = cpu.dcache.size if cpu.dcache is not None else '64kB'
+        return {synth.CMD: ' '.join(cpu.workload.cmd),
+                synth.PREDICTOR: type(predictor).__name__ if predictor else 'TournamentBP',
+                synth.DCACHE_SIZE: synth.size_bytes(dcache_size)}
+
+state = State()
+
+def instantiate(ckpt_dir=None):
+    time.sleep(state.instantiate_s)
+    state.active = list(state.root.system.cpu)
+    with open(os.path.join(options.outdir, 'config.ini'), 'w') as f:
+        f.write(state.template.config(state.config()))
+
+def simulate(ticks=MaxTick):
+    start = state.tick
+    # (tick, cause, cpu) of everything that could stop the simulation,
+    # the program exit wins ties
+    events = [(state.program_ticks, 0, EXIT_CAUSE, None),
+              (min(start + ticks, MaxTick), 1, LIMIT_CAUSE, None)]
+    for cpu in state.active:
+        for insts, cause in cpu.stops:
+            events.append((start + state.ticks_for(max(insts - cpu.insts, 0)), 2, cause, cpu))
+    end, order, cause, stopped = min(events, key=lambda event: event[:2])
+    end = max(end, start)
+    time.sleep(state.simulate_s * (end - start) / state.program_ticks)
+    for cpu in state.active:
+        cpu.insts += state.insts_for(end) - state.insts_for(start)
+    state.tick = end
+    if stopped is not None:
+        stopped.stops = [stop for stop in stopped.stops if stop[1] != cause]
+    return ExitEvent(cause, state.exit_code if cause == EXIT_CAUSE else 0)
+
+def curTick():
+    return state.tick
+
+def switchCpus(system, pairs):
+    state.active = [new for old, new in pairs]
+
+def checkpoint(directory):
+    os.makedirs(directory, exist_ok=True)
+    open(os.path.join(directory, 'm5.cpt'), 'w').close()
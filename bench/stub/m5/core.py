@@ -0,0 +1,2 @@
+def setOutputDir(path):
+    pass
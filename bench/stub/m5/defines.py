@@ -0,0 +1 @@
+buildEnv = {'TARGET_ISA': 'x86'}
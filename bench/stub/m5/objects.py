@@ -0,0 +1,95 @@
+"""SimObjects of the stub m5: they keep the parameters they are given."""
+import m5
+
+__all__ = ['SimObject', 'BaseCPU', 'DerivO3CPU', 'AtomicSimpleCPU', 'TournamentBP', 'BiModeBP',
+           'LocalBP', 'Process', 'System', 'SrcClockDomain', 'VoltageDomain', 'SystemXBar',
+           'Root', 'AddrRange']
+
+class SimObject(object):
+    def __init__(self, **params):
+        self.__dict__.update(params)
+
+    def __getattr__(self, name):
+        # ports (membus.slave, system_port, ...) and parameters nobody set
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return None
+
+class BaseCPU(SimObject):
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.insts = 0
+        self.stops = []
+
+    def __getitem__(self, i):
+        # cpu[cpu_id] in gem5script.create_cpu
+        return self
+
+    def __setattr__(self, name, value):
+        if name == 'max_insts_any_thread':
+            self.stops.append((int(value), m5.MAX_INSTS_CAUSE))
+        object.__setattr__(self, name, value)
+
+    def memory_mode(self):
+        return 'timing'
+
+    def createThreads(self):
+        pass
+
+    def createInterruptController(self):
+        pass
+
+    def connectAllPorts(self, bus):
+        pass
+
+    def addPrivateSplitL1Caches(self, icache, dcache, iwc=None, dwc=None):
+        self.icache = icache
+        self.dcache = dcache
+
+    def totalInsts(self):
+        return self.insts
+
+    def scheduleInstStop(self, tid, insts, cause):
+        self.stops.append((self.insts + insts, cause))
+
+class DerivO3CPU(BaseCPU):
+    pass
+
+class AtomicSimpleCPU(BaseCPU):
+    def memory_mode(self):
+        return 'atomic'
+
+class BranchPredictor(SimObject):
+    pass
+
+class TournamentBP(BranchPredictor):
+    pass
+
+class BiModeBP(BranchPredictor):
+    pass
+
+class LocalBP(BranchPredictor):
+    pass
+
+class Process(SimObject):
+    pass
+
+class System(SimObject):
+    pass
+
+class SrcClockDomain(SimObject):
+    pass
+
+class VoltageDomain(SimObject):
+    pass
+
+class SystemXBar(SimObject):
+    pass
+
+class Root(SimObject):
+    def __init__(self, **params):
+        super().__init__(**params)
+        m5.state.root = self
+
+def AddrRange(*args):
+    return args
@@ -0,0 +1,15 @@
+"""stats.txt of the stub m5, see m5/__init__.py."""
+import os
+import time
+
+import m5
+
+def reset():
+    m5.state.reset()
+
+def dump():
+    delay = float(os.environ.get('BENCH_M5_DUMP', '0'))
+    if delay:
+        time.sleep(delay)
+    with open(os.path.join(m5.options.outdir, 'stats.txt'), 'a') as f:
+        f.write(m5.state.template.stats(m5.state.stats()))
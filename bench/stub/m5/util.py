@@ -0,0 +1,7 @@
+import sys
+
+def addToPath(path):
+    pass
+
+def fatal(fmt, *args):
+    sys.exit("fatal: " + (fmt % args if args else fmt))
@@ -0,0 +1,205 @@
+"""
+Synthetic result directories, for benchmarking the analyser.
+
+A template run (by default the first one in output_final) provides the
+text of stats.txt and config.ini; every synthetic run is a copy of it with
+the configuration fields the analyser reads (program and arguments,
+branch predictor, L1D size) and the stats of gem5_analyser.allowed_stats
+replaced by plausible values. Runs cycle over the configurations of the
+original sweep (both binaries, three predictors, eight cache sizes, four
+matrices), so past 192 runs every configuration is repeated, as with
+repeated sweeps.
+
+With compact, stats.txt only has the replaced stats and config.ini only
+the sections the analyser reads (a few hundred bytes per run instead of
+~125 kB, for trees of 10^5 runs).
+
+Usage:
+    python3 bench/synth.py DIR --count 10000 [--compact] [--seed 0]
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import re
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BEGIN_MARK = '---------- Begin Simulation Statistics ----------'
+END_MARK = '---------- End Simulation Statistics   ----------'
+
+BENCHMARKS = ['blocked-matmul', 'blocked-matmul-no-unroll']
+PREDICTORS = [('tourn', 'TournamentBP'), ('bi', 'BiModeBP'), ('local', 'LocalBP')]
+CACHE_KB = [8, 16, 32, 64, 128, 256, 512, 1024]
+MATRICES = [(50, 50, 50), (100, 100, 100), (50, 100, 20), (128, 50, 20)]
+
+# config.ini fields read by gem5_analyser.getTest
+CMD = ('system.cpu.workload', 'cmd')
+PREDICTOR = ('system.cpu.branchPred', 'type')
+DCACHE_SIZE = ('system.cpu.dcache.tags', 'size')
+
+# gem5 ticks per CPU cycle at the default 2GHz cpu_clock
+TICKS_PER_CYCLE = 500
+
+_STAT_LINE = re.compile(r'^(\S+)(\s+)(\S+)(.*)$', re.S)
+
+def default_template():
+    rootdir = os.path.join(REPO, 'output_final')
+    runs = sorted(entry.name for entry in os.scandir(rootdir)
+                  if not entry.name.startswith('.') and entry.is_dir())
+    if not runs:
+        raise RuntimeError("no template run in " + rootdir)
+    return os.path.join(rootdir, runs[0])
+
+def size_bytes(size):
+    """'32kB' -> 32768"""
+    match = re.match(r'^(\d+)\s*([kKmMgG]?)i?B?$', str(size))
+    if not match:
+        raise ValueError("can't parse size %r" % size)
+    number, unit = match.groups()
+    return int(number) * 1024 ** ' kmg'.index(unit.lower() or ' ')
+
+def format_value(value):
+    if isinstance(value, float):
+        return '%.6f' % value
+    return str(value)
+
+class RunTemplate(object):
+    """stats.txt (first block) and config.ini of a run, with the lines of
+    every stat and option indexed so copies with other values are cheap."""
+    def __init__(self, path=None):
+        path = path or default_template()
+        self.path = path
+        self.stats_lines = []
+        with open(os.path.join(path, 'stats.txt')) as f:
+            for line in f:
+                if self.stats_lines or line.startswith(BEGIN_MARK):
+                    self.stats_lines.append(line)
+                if line.startswith(END_MARK):
+                    break
+        self.stat_index = {}
+        for i, line in enumerate(self.stats_lines):
+            match = _STAT_LINE.match(line)
+            if match:
+                self.stat_index.setdefault(match.group(1), i)
+        with open(os.path.join(path, 'config.ini')) as f:
+            self.config_lines = f.readlines()
+        self.config_index = {}
+        self.sections = {}
+        section = None
+        for i, line in enumerate(self.config_lines):
+            if line.startswith('['):
+                section = line.strip()[1:-1]
+                self.sections[section] = [i, i + 1]
+                continue
+            if section is not None:
+                self.sections[section][1] = i + 1
+            option, sep, value = line.partition('=')
+            if sep:
+                self.config_index[(section, option)] = i
+        self.sections = {name: tuple(lines) for name, lines in self.sections.items()}
+
+    def stats(self, values, compact=False):
+        """Text of stats.txt with the stats in values replaced."""
+        for name in values:
+            if name not in self.stat_index:
+                raise KeyError("no stat %s in %s" % (name, self.path))
+        if compact:
+            indices = sorted(self.stat_index[name] for name in values)
+            lines = ([self.stats_lines[0]] + [self.stats_lines[i] for i in indices] +
+                     [self.stats_lines[-1]])
+            positions = {i: n + 1 for n, i in enumerate(indices)}
+        else:
+            lines = list(self.stats_lines)
+            positions = None
+        for name, value in values.items():
+            i = self.stat_index[name]
+            if positions is not None:
+                i = positions[i]
+            name, space, old, rest = _STAT_LINE.match(lines[i]).groups()
+            new = format_value(value)
+            # keep the value column right aligned as gem5 writes it
+            lines[i] = name + ' ' * max(1, len(space) + len(old) - len(new)) + new + rest
+        return '\n' + ''.join(lines) + '\n'
+
+    def config(self, values, compact=False):
+        """Text of config.ini with the (section, option) fields in values
+        replaced."""
+        lines = list(self.config_lines)
+        for (section, option), value in values.items():
+            lines[self.config_index[(section, option)]] = '%s=%s\n' % (option, value)
+        if compact:
+            sections = sorted(set(self.sections[section] for section, option in values))
+            lines = [line for start, end in sections for line in lines[start:end]]
+        return ''.join(lines)
+
+def configurations():
+    """(benchmark, (predictor option, class), cache kB, matrix) of the
+    original sweep."""
+    return list(itertools.product(BENCHMARKS, PREDICTORS, CACHE_KB, MATRICES))
+
+def run_stats(benchmark, predictor, cache_kb, matrix, rng):
+    """Plausible allowed_stats of one run; rng adds ~1% of noise."""
+    I, J, K = matrix
+    unrolled = benchmark == 'blocked-matmul'
+    insts = int((8 if unrolled else 11) * I * J * K + 4 * (I * J + J * K + I * K) + 250000)
+    footprint_kb = 4 * (I * J + J * K + I * K) / 1024
+    hit = 1 - 0.6 / (1 + math.exp(math.log2(cache_kb / footprint_kb) * 2))
+    miss_rate = {'TournamentBP': 0.015, 'BiModeBP': 0.02, 'LocalBP': 0.03}[predictor[1]]
+    noise = lambda: 1 + rng.gauss(0, 0.01)
+    ipc = (2.6 if unrolled else 1.9) * hit * (1 - 4 * miss_rate) * noise()
+    cycles = int(insts / ipc)
+    predicted = int(insts / (14 if unrolled else 9) * noise())
+    return {'sim_ticks': cycles * TICKS_PER_CYCLE,
+            'sim_insts': insts,
+            'system.cpu.ipc': insts / cycles,
+            'system.cpu.branchPred.condPredicted': predicted,
+            'system.cpu.branchPred.condIncorrect': int(predicted * miss_rate * noise()),
+            'system.mem_ctrls.pageHitRate': min(100.0, 100 * hit * noise())}
+
+def run_config(benchmark, predictor, cache_kb, matrix):
+    return {CMD: './%s %d %d %d' % ((benchmark,) + matrix),
+            PREDICTOR: predictor[1],
+            DCACHE_SIZE: cache_kb * 1024}
+
+def run_name(benchmark, predictor, cache_kb, matrix, n):
+    """Directory name in the format of gem5script.start_one_simulation."""
+    return '%s_l1d-%dkB_BP-%s_M-%d,%d,%d_%06d' % ((benchmark, cache_kb, predictor[0]) +
+                                                  matrix + (n,))
+
+def generate(rootdir, count, template=None, seed=0, compact=False, start=0):
+    """Write runs start..start+count-1 under rootdir; returns their
+    directory names."""
+    template = template or RunTemplate()
+    configs = configurations()
+    names = []
+    os.makedirs(rootdir, exist_ok=True)
+    for n in range(start, start + count):
+        config = configs[n % len(configs)]
+        rng = random.Random(seed * 1000003 + n)
+        name = run_name(*(config + (n,)))
+        folder = os.path.join(rootdir, name)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, 'stats.txt'), 'w') as f:
+            f.write(template.stats(run_stats(*(config + (rng,))), compact))
+        with open(os.path.join(folder, 'config.ini'), 'w') as f:
+            f.write(template.config(run_config(*config), compact))
+        names.append(name)
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic gem5 result directories")
+    parser.add_argument('rootdir', help="directory to write the runs to")
+    parser.add_argument('--count', type=int, default=1000, help="number of runs")
+    parser.add_argument('--compact', action='store_true',
+                        help="only the stats and config sections the analyser reads")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--template', default=None,
+                        help="run to copy stats.txt and config.ini from (first run of output_final)")
+    args = parser.parse_args()
+    generate(args.rootdir, args.count, RunTemplate(args.template), args.seed, args.compact)
+    print("%d runs in %s" % (args.count, args.rootdir))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Trace-driven L1D model of blocked-matmul, to prune sweep points.
+
+blocked_matmul (blocked-matmul.c) touches memory in a fixed pattern for
+given I, K, J, so its L1D hit rate for a cache size, associativity and
+line size can be estimated without gem5. The address stream of the
+program (filling A, B and C, then four calls to blocked_matmul) is
+generated with NumPy and run through a set-associative LRU cache. Sets
+are independent, so all of them are simulated at once: the accesses are
+sorted by set and the simulation steps through the i-th access of every
+set together.
+
+The model ignores the stack, code and prefetching, and assumes A, B and C
+are laid out back to back (they are static arrays of MAX_SIZE*MAX_SIZE
+floats), so it is only meant to tell which points of an l1d_size axis
+are worth simulating. Usage:
+
+    python3 cache_model.py tests.json --out pruned.json [--tol 0.002] [--defer]
+
+prints the predicted hit rate of every blocked-matmul job of the sweep
+and writes a copy of it where the interior points of each l1d_size axis
+whose hit rate is within --tol of both neighbours are listed under
+"skip" (or "defer", to run them last instead). See sweep.py.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import sweep
+from utils import size_bytes
+
+# blocked-matmul.c
+MAX_SIZE = 110
+FLOAT_BYTES = 4
+ITERATIONS = 4
+
+# gem5 defaults of the options the model depends on
+DEFAULT_L1D_SIZE = '64kB'
+DEFAULT_L1D_ASSOC = 2
+DEFAULT_CACHELINE_SIZE = 64
+
+
+def matmul_addresses(I, K, J):
+    """Byte addresses read or written by blocked-matmul I K J, in order."""
+    matrix_bytes = MAX_SIZE * MAX_SIZE * FLOAT_BYTES
+    A, B, C = 0, matrix_bytes, 2 * matrix_bytes
+    # random_matrix(A, I, J), random_matrix(B, J, K), random_matrix(C, I, K)
+    fill = np.concatenate([A + FLOAT_BYTES * np.arange(I * J),
+                           B + FLOAT_BYTES * np.arange(J * K),
+                           C + FLOAT_BYTES * np.arange(I * K)])
+    i = np.arange(0, I, 2)[:, None, None]
+    j = np.arange(0, J, 2)[None, :, None]
+    k = np.arange(0, K, 2)[None, None, :]
+    # the four elements of C of a 2x2 block, read before and written after the k loop
+    c = np.stack(np.broadcast_arrays(i * J + j, i * J + j + 1,
+                                     (i + 1) * J + j, (i + 1) * J + j + 1), axis=-1)[:, :, 0, :]
+    c = C + FLOAT_BYTES * c
+    # per k step: A[i][k], A[i][k+1], A[i+1][k], A[i+1][k+1], B[k][j], B[k][j+1], ...
+    ab = np.stack(np.broadcast_arrays(
+        A + FLOAT_BYTES * (i * K + k), A + FLOAT_BYTES * (i * K + k + 1),
+        A + FLOAT_BYTES * ((i + 1) * K + k), A + FLOAT_BYTES * ((i + 1) * K + k + 1),
+        B + FLOAT_BYTES * (k * J + j), B + FLOAT_BYTES * (k * J + j + 1),
+        B + FLOAT_BYTES * ((k + 1) * J + j), B + FLOAT_BYTES * ((k + 1) * J + j + 1)), axis=-1)
+    ab = ab.reshape(ab.shape[0], ab.shape[1], -1)
+    call = np.concatenate([c, ab, c], axis=-1).reshape(-1)
+    return np.concatenate([fill] + [call] * ITERATIONS)
+
+def lru_hits(lines, num_sets, assoc):
+    """Number of hits of a stream of line addresses in a set-associative
+    LRU cache that starts empty."""
+    sets = lines % num_sets
+    tags = lines // num_sets
+    order = np.argsort(sets, kind='stable')
+    sets = sets[order]
+    tags = tags[order]
+    # an access to the line the set saw last is a hit and leaves the LRU
+    # order as it was
+    repeat = np.zeros(len(tags), dtype=bool)
+    repeat[1:] = (sets[1:] == sets[:-1]) & (tags[1:] == tags[:-1])
+    hits = int(repeat.sum())
+    sets = sets[~repeat]
+    tags = tags[~repeat]
+    if not len(tags):
+        return hits
+    # step x set grid of tags, -1 where a set has no more accesses
+    counts = np.bincount(sets, minlength=num_sets)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    step = np.arange(len(tags)) - starts[sets]
+    grid = np.full((counts.max(), num_sets), -1, dtype=np.int64)
+    grid[step, sets] = tags
+    # ways of every set, most recently used first
+    state = np.full((num_sets, assoc), -1, dtype=np.int64)
+    ways = np.arange(assoc)[None, :]
+    for tag in grid:
+        active = tag >= 0
+        match = state == tag[:, None]
+        hit = match.any(axis=1) & active
+        hits += int(hit.sum())
+        # the hit way (or the LRU way on a miss) moves to the front
+        way = np.where(hit, match.argmax(axis=1), assoc - 1)
+        shifted = np.roll(state, 1, axis=1)
+        new = np.where((ways > 0) & (ways <= way[:, None]), shifted, state)
+        new[:, 0] = tag
+        state = np.where(active[:, None], new, state)
+    return hits
+
+def hit_rate(I, K, J, l1d_size, assoc, line_size):
+    addresses = matmul_addresses(I, K, J)
+    num_sets = size_bytes(l1d_size) // (line_size * assoc)
+    return lru_hits(addresses // line_size, num_sets, assoc) / len(addresses)
+
+def is_matmul(settings, default_cmd):
+    return os.path.basename(settings.get('cmd', default_cmd) or '').startswith('blocked-matmul')
+
+def predict(jobs, defaults):
+    """{job key: predicted L1D hit rate} for the blocked-matmul jobs."""
+    rates = {}
+    cache = {}
+    for job in jobs:
+        settings = dict(defaults, **job.settings)
+        if not is_matmul(settings, None):
+            continue
+        # argv of blocked-matmul: I K J
+        I, K, J = [int(arg) for arg in settings['options'].split()]
+        config = (I, K, J, settings['l1d_size'], int(settings['l1d_assoc']),
+                  int(settings['cacheline_size']))
+        if config not in cache:
+            cache[config] = hit_rate(*config)
+        rates[job.key] = cache[config]
+    return rates
+
+def redundant(jobs, rates, tolerance):
+    """Keys of the interior points of each l1d_size axis whose predicted
+    hit rate is within tolerance of the closest kept point below and of
+    the next point above."""
+    groups = {}
+    for job in jobs:
+        if job.key not in rates:
+            continue
+        rest = tuple(sorted((name, str(value)) for name, value in job.settings.items()
+                            if name != 'l1d_size'))
+        groups.setdefault(rest, []).append(job)
+    keys = []
+    for group in groups.values():
+        group.sort(key=lambda job: size_bytes(job.settings['l1d_size']))
+        kept = group[0]
+        for job, following in zip(group[1:-1], group[2:]):
+            if (abs(rates[job.key] - rates[kept.key]) <= tolerance and
+                    abs(rates[following.key] - rates[job.key]) <= tolerance):
+                keys.append(job.key)
+            else:
+                kept = job
+    return keys
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune the l1d_size axis of a blocked-matmul sweep")
+    parser.add_argument('test', help="tests.json or sweep spec")
+    parser.add_argument('--out', required=True, help="where to write the pruned sweep")
+    parser.add_argument('--tol', type=float, default=0.002,
+                        help="hit rate difference below which neighbouring sizes are the same")
+    parser.add_argument('--defer', action='store_true',
+                        help="run redundant points last instead of skipping them")
+    parser.add_argument('--cmd', default='./blocked-matmul',
+                        help="program of jobs that do not set cmd")
+    parser.add_argument('--l1d_assoc', type=int, default=DEFAULT_L1D_ASSOC)
+    parser.add_argument('--cacheline_size', type=int, default=DEFAULT_CACHELINE_SIZE)
+    args = parser.parse_args()
+
+    with open(args.test) as json_file:
+        tests = json.load(json_file)
+    jobs, total = sweep.load_jobs(tests)
+    jobs = list(jobs)
+    defaults = {'cmd': args.cmd, 'l1d_size': DEFAULT_L1D_SIZE,
+                'l1d_assoc': args.l1d_assoc, 'cacheline_size': args.cacheline_size}
+    rates = predict(jobs, defaults)
+    if not rates:
+        sys.exit("no blocked-matmul jobs in " + args.test)
+    for job in jobs:
+        if job.key in rates:
+            print("%8.4f  %s" % (rates[job.key], job.key))
+    keys = redundant(jobs, rates, args.tol)
+    field = 'defer' if args.defer else 'skip'
+    tests[field] = sorted(set(tests.get(field, [])) | set(keys))
+    with open(args.out, 'w') as outfile:
+        json.dump(tests, outfile)
+    print("%d of %d jobs listed under \"%s\" in %s" % (len(keys), len(jobs), field, args.out))
+
+if __name__ == '__main__':
+    main()
@@ -1,383 +1,384 @@
 import os
 import re
-import configparser
-import matplotlib
-import matplotlib.pyplot as plt
+import sys
+import argparse
+import hashlib
+import multiprocessing
 import numpy as np
+import stats_reader
+import results_store
+import render
+import pack
+import metrics
+import aggregate
  
 rootdir = 'output_final' # estas son 100x100, 50x50, 50x100*100x20, 128x50*50x20.
+storedir = 'results_store' # dataset por columnas (ver results_store.py)
 allowed_stats = ['sim_ticks', 'system.cpu.ipc',
                     'system.cpu.branchPred.condPredicted', 
                     'system.cpu.branchPred.condIncorrect',
-                    'system.mem_ctrls.pageHitRate']
+                    'system.mem_ctrls.pageHitRate',
+                    'sim_insts']
 MATRIX_BASELINE = [128, 50, 20]
 BP_BASELINE = 'TournamentBP'
 CACHE_SIZE_BASELINE = 8192
 LOOP_UNROLLING_BASELINE = True
-# Recibe dos listas desordenadas y correspondientes y las reordena
-def sort(x,y):
-    assert(len(x)==len(y))
-    data = {}
-    for i in range (len(x)):
-        data[x[i]]=y[i]
-    data = sorted(data.items())
-    x = []
-    y = []
-    for d in data:
-        x.append(d[0])
-        y.append(d[1])
-    return x , y
-# transforma un diccionario de diccionarios en un diccionario de listas
-def dictToList(dicti, dict_list):
-    labels= []
-    for key, data in dicti.items():
-        sortDic = sorted(data.items())
-        for ele in sortDic:
-            if (key == BP_BASELINE ):
-                labels.append(ele[0])
-            dict_list[key].append(ele[1])
-    return labels, dict_list
+INGEST_WORKERS = None # procesos para leer los folders, None = os.cpu_count()
+# stats de cada periodo de una corrida con --stats_period (ver loadTimeseries)
+timeseries_stats = ['final_tick', 'sim_ticks',
+                    'system.cpu.committedInsts', 'system.cpu.numCycles', 'system.cpu.ipc',
+                    'system.cpu.branchPred.condPredicted',
+                    'system.cpu.branchPred.condIncorrect',
+                    'system.cpu.dcache.overall_miss_rate::total']
 def getFolders(rootdir):
     dirlist = []
-    with os.scandir(rootdir) as rit:
-        for entry in rit:
-            if not entry.name.startswith('.') and entry.is_dir():
-                dirlist.append(entry.path)
+    if os.path.isfile(rootdir):
+        # archivo de pack.py: cada corrida es "archivo.zip/<llave>"
+        dirlist = [os.path.join(rootdir, key) for key in pack.open_archive(rootdir).keys()]
+    else:
+        with os.scandir(rootdir) as rit:
+            for entry in rit:
+                if not entry.name.startswith('.') and entry.is_dir():
+                    dirlist.append(entry.path)
 
     dirlist.sort()
     print('Total folders ' , len(dirlist))
     return dirlist
 
     
+config_fields = [('system.cpu.workload', 'cmd'),
+                 ('system.cpu.branchPred', 'type'),
+                 ('system.cpu.dcache.tags', 'size')]
+
+# Ruta de un archivo del folder, o sus lineas si el folder esta empacado
+def folderFile(folder, name):
+    return pack.run_file(folder, name)
+
 def getTest(folder):
-    config = configparser.ConfigParser()
-    config.read(folder+'/config.ini')
+    config = stats_reader.read_config(folderFile(folder, 'config.ini'), config_fields)
 
-    cmd=config['system.cpu.workload']['cmd']
-    matrix_size = cmd.split(' ')
-    if re.match('.*/blocked-matmul .*', config['system.cpu.workload']['cmd']):
+    cmd=config[('system.cpu.workload', 'cmd')]
+    args = cmd.split(' ')
+    if re.match('.*/blocked-matmul .*', cmd):
         LOOP_UNROLLING = True
     else:
         LOOP_UNROLLING = False
+    # solo las multiplicaciones de matrices reciben I J K, el resto queda en 0
+    try:
+        matrix_size = [int(arg) for arg in args[1:4]]
+    except ValueError:
+        matrix_size = []
+    if len(matrix_size) != 3:
+        matrix_size = [0, 0, 0]
 
-    stats = {}
-    filestat=open(folder + '/stats.txt','r')
-    for line in filestat.readlines():
-        line = re.split(' +', line) # cualquier cantidad de espacios
-        if line[0] in allowed_stats:
-            stats[line[0]] = line[1]
-
+    # solo las llaves de allowed_stats, de toda la corrida: en las corridas
+    # con --stats_period se suman los contadores de todos los periodos
+    stats = stats_reader.read_run_stats(folderFile(folder, 'stats.txt'), allowed_stats)
 
-    return {'BP': config['system.cpu.branchPred']['type'],
+    return {'folder': folder,
+         'Benchmark': os.path.basename(args[0]),
+         'BP': config[('system.cpu.branchPred', 'type')],
          'LOOP_UNROLLING': LOOP_UNROLLING,
-         'CacheSize': config['system.cpu.dcache.tags']['size'],
-         'M_I':int(matrix_size[1]), 'M_J':int(matrix_size[2]), 'M_K':int(matrix_size[3]),
+         'CacheSize': config[('system.cpu.dcache.tags', 'size')],
+         'M_I':matrix_size[0], 'M_J':matrix_size[1], 'M_K':matrix_size[2],
          'stats': stats}
 
-def plotIPC(dataset, BP, LOOP_UNROLLING, I, J, K, file):
-    # Data for plotting
-    x = []
-    y = []
-    for data in dataset:
-        if (data['BP'] == BP and data['M_I'] == I and data['M_J'] == J and data['M_K'] == K and data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            x.append(int(data['CacheSize'])/1024)
-            y.append(float(data['stats']['system.cpu.ipc']))
+# Serie de tiempo de una corrida: un valor por bloque de stats.txt, es decir
+# por periodo de --stats_period/--stats_period_insts. getTest lee los
+# totales de toda la corrida (ver stats_reader.read_run_stats).
+def loadTimeseries(folder, keys=timeseries_stats):
+    blocks = list(stats_reader.iter_blocks(folderFile(folder, 'stats.txt'), keys))
+    return stats_reader.to_arrays(blocks, keys)
 
-    x , y = sort(x,y)
-    x = np.array(x)
-    y = np.array(y)
+def printTimeseries(folder):
+    series = loadTimeseries(folder)
+    predicted = series['system.cpu.branchPred.condPredicted']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        missrate = series['system.cpu.branchPred.condIncorrect'] / predicted
+    print('%14s %12s %7s %9s %9s' % ('final_tick', 'insts', 'ipc', 'bp_miss', 'd$_miss'))
+    for row in zip(series['final_tick'], series['system.cpu.committedInsts'],
+                   series['system.cpu.ipc'], missrate,
+                   series['system.cpu.dcache.overall_miss_rate::total']):
+        print('%14d %12d %7.3f %9.4f %9.4f' % row)
 
-    fig, ax = plt.subplots()
-    ax.plot(x, y)
-    loop = ' with -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    ax.set(xlabel='Cache Size (Kb)', ylabel='IPC',
-        title=('Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+', '+ BP+ loop))
-    ax.grid()
+# Una fila por configuracion: corridas, media +- intervalo de 95% y speedup
+# contra la configuracion baseline del mismo benchmark y matriz. Si no se
+# sabe si la metrica es mejor alta o baja, la diferencia con el baseline
+def printComparison(comparison):
+    if comparison.lower_is_better is None:
+        against, number = 'delta', '%9.4g'
+    else:
+        against, number = 'speedup', '%9.4f'
+    print('%-26s %-13s %4s %8s %3s %-16s %3s %12s %12s %9s %9s' % (
+        'Benchmark', 'BP', 'loop', 'cache', 'n', 'matriz', '', comparison.name, '+-95%',
+        against, '+-95%'))
+    for row in comparison.rows():
+        print(('%-26s %-13s %4s %7dk %3d %-16s %3s %12.6g %12.4g ' + number + ' ' + number) % (
+            row['Benchmark'], row['BP'], 'si' if row['LOOP_UNROLLING'] else 'no',
+            row['CacheSize'] // 1024, row['count'],
+            '%dx%d*%dx%d' % (row['M_I'], row['M_J'], row['M_J'], row['M_K']), '',
+            row['mean'], row['ci95'], row[against], row[against + '_ci95']))
 
-    fig.savefig(file)
+# Lee todos los folders con un pool de procesos. imap conserva el orden de
+# dirlist, asi que el dataset es el mismo sin importar cuantos workers haya.
+def loadDataset(dirlist, workers=INGEST_WORKERS, task=getTest):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(dirlist) < 2:
+        return [task(folder) for folder in dirlist]
+    # pedazos grandes reducen el costo de ida y vuelta entre procesos, pero
+    # se dejan varios por worker para balancear la carga
+    chunksize = max(1, len(dirlist) // (workers * 4))
+    dataset = []
+    step = max(1, len(dirlist) // 10)
+    with multiprocessing.Pool(workers) as pool:
+        for test in pool.imap(task, dirlist, chunksize):
+            dataset.append(test)
+            if len(dataset) % step == 0 or len(dataset) == len(dirlist):
+                sys.stderr.write('\rIngested %d/%d' % (len(dataset), len(dirlist)))
+    sys.stderr.write('\n')
+    return dataset
 
-def plotBranchMiss(dataset, LOOP_UNROLLING, I, J, K, file):
-    # data to plot
-    miss_rate = {'LocalBP':{},'BiModeBP':{},'TournamentBP':{}}
-    miss_rate_list = {'LocalBP':[],'BiModeBP':[],'TournamentBP':[]}
-    cachesizes = []
-    #Populate Data
-    for data in dataset:
-        if (data['M_I'] == I and data['M_J'] == J and data['M_K'] == K and data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            miss = int(data['stats']['system.cpu.branchPred.condPredicted'])/int(data['stats']['system.cpu.branchPred.condIncorrect']) * 100
-            miss_rate[data['BP']][int(data['CacheSize'])/1024] = miss
-    cachesizes, miss_rate_list = dictToList (miss_rate, miss_rate_list)
-    # create plot
-    fig, ax = plt.subplots()
-    index = np.arange(len(cachesizes))
-    bar_width = 0.3
-    opacity = 0.8
-    
-    rects1 = plt.bar(index, miss_rate_list['TournamentBP'], bar_width,
-                    alpha=opacity,
-                    color='b',
-                    label='TournamentBP')
-    
-    rects2 = plt.bar(index + bar_width, miss_rate_list['BiModeBP'], bar_width,
-                    alpha=opacity,
-                    color='g',
-                    label='BiModeBP')
-    rects3 = plt.bar(index + bar_width*2, miss_rate_list['LocalBP'], bar_width,
-                    alpha=opacity,
-                    color='r',
-                    label='LocalBP')
+# Firma de un folder para el manifest: mtime y tamaño de los archivos que se
+# leen, y un hash del contenido para no re-parsear folders solo "tocados"
+def folderSignature(folder):
+    archive, key = pack.split_path(folder)
+    if archive:
+        # si el archivo cambia se comparan los hashes guardados en su indice
+        return {'mtime': os.stat(archive).st_mtime_ns, 'size': 0}
+    signature = {'mtime': 0, 'size': 0}
+    for name in ['stats.txt', 'config.ini']:
+        st = os.stat(os.path.join(folder, name))
+        signature['mtime'] = max(signature['mtime'], st.st_mtime_ns)
+        signature['size'] += st.st_size
+    return signature
 
-    loop = ' con -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    plt.xlabel('Tamaño Caché (Kb)')
-    plt.ylabel('Porcentaje de Taza de Exito del Predictor de branches')
-    plt.title('Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+ loop)
-    plt.xticks(index + bar_width, cachesizes)
-    plt.legend()
-    
-    plt.tight_layout()
-    plt.savefig(file)
+def folderHash(folder):
+    archive, key = pack.split_path(folder)
+    if archive:
+        return pack.open_archive(archive).run_hash(key)
+    digest = hashlib.sha1()
+    for name in ['stats.txt', 'config.ini']:
+        with open(os.path.join(folder, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
 
+def ingestFolder(folder):
+    entry = folderSignature(folder)
+    entry['hash'] = folderHash(folder)
+    return getTest(folder), entry
 
-def plotBranchMissMatrix(dataset, CACHE_SIZE, LOOP_UNROLLING, file):
-    # data to plot
-    miss_rate = {'LocalBP':{},'BiModeBP':{},'TournamentBP':{}}
-    miss_rate_list = {'LocalBP':[],'BiModeBP':[],'TournamentBP':[]}
-    matrixsizes = []
-    #Populate Data
-    for data in dataset:
-        if (int(data['CacheSize']) == CACHE_SIZE and  data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            matrixsize = str(data['M_I'])+'x'+str(data['M_J'])+'*'+str(data['M_J'])+'x'+str(data['M_K'])
-            miss = int(data['stats']['system.cpu.branchPred.condPredicted'])/int(data['stats']['system.cpu.branchPred.condIncorrect']) * 100
-            miss_rate[data['BP']][matrixsize] = miss
-    matrixsizes, miss_rate_list = dictToList(miss_rate, miss_rate_list)
-    # create plot
-    fig, ax = plt.subplots()
-    index = np.arange(len(matrixsizes))
-    bar_width = 0.3
-    opacity = 0.8
-    
-    rects1 = plt.bar(index, miss_rate_list['TournamentBP'], bar_width,
-                    alpha=opacity,
-                    color='b',
-                    label='TournamentBP')
-    
-    rects2 = plt.bar(index + bar_width, miss_rate_list['BiModeBP'], bar_width,
-                    alpha=opacity,
-                    color='g',
-                    label='BiModeBP')
-    rects3 = plt.bar(index + bar_width*2, miss_rate_list['LocalBP'], bar_width,
-                    alpha=opacity,
-                    color='r',
-                    label='LocalBP')
+def storeManifest(folders):
+    return {'stats': allowed_stats, 'columns': results_store.KEY_COLUMNS, 'folders': folders}
+
+# Actualiza el store: solo se leen los folders nuevos o que cambiaron segun
+# el manifest, y se quitan las filas de los folders que ya no existen. El
+# resultado es el mismo que leer todo otra vez.
+def ingest(rootdir, storedir, reingest=False):
+    dirlist = getFolders(rootdir)
+    table = None
+    manifest = {}
+    if results_store.exists(storedir) and not reingest:
+        old_manifest = results_store.load_manifest(storedir)
+        # si cambian las llaves de allowed_stats o las columnas del store
+        # hay que leer todo otra vez
+        if (old_manifest.get('stats') == allowed_stats and
+                old_manifest.get('columns') == results_store.KEY_COLUMNS):
+            table = results_store.ResultsTable.load(storedir)
+            manifest = old_manifest['folders']
+
+    keep = []
+    changed = []
+    for folder in dirlist:
+        entry = manifest.get(folder)
+        if entry is None:
+            changed.append(folder)
+            continue
+        signature = folderSignature(folder)
+        if signature['mtime'] != entry['mtime'] or signature['size'] != entry['size']:
+            signature['hash'] = folderHash(folder)
+            if signature['hash'] != entry['hash']:
+                changed.append(folder)
+                continue
+            manifest[folder] = signature
+        keep.append(folder)
+    removed = len(manifest) - len(keep) - sum(1 for f in changed if f in manifest)
+    print('Folders sin cambios', len(keep), 'nuevos o cambiados', len(changed), 'borrados', removed)
+    if table is not None and not changed and not removed and len(keep) == len(table):
+        if manifest != results_store.load_manifest(storedir)['folders']:
+            results_store.save_manifest(storedir, storeManifest(manifest))
+        return table
+
+    parts = []
+    if table is not None and keep:
+        parts.append(table.select(np.isin(table['folder'], keep)))
+    if changed:
+        results = loadDataset(changed, task=ingestFolder)
+        parts.append(results_store.ResultsTable.from_records(
+            [test for test, entry in results], allowed_stats))
+        for folder, (test, entry) in zip(changed, results):
+            manifest[folder] = entry
+    folders = set(dirlist)
+    manifest = {folder: entry for folder, entry in manifest.items() if folder in folders}
+    if not parts:
+        parts.append(results_store.ResultsTable.from_records([], allowed_stats))
+    # mismo orden que getFolders, como si se hubiera leido todo
+    table = results_store.ResultsTable.concat(parts)
+    table = table.select(np.argsort(table['folder'], kind='stable'))
+    table.save(storedir, manifest=storeManifest(manifest))
+    return results_store.ResultsTable.load(storedir)
 
+# Especificaciones de las graficas (ver render.PlotSpec)
+# El binario de la multiplicacion de matrices con y sin -funroll-loops; las
+# graficas solo toman sus corridas aunque el store tenga otros benchmarks
+def matmulBenchmark(LOOP_UNROLLING):
+    return 'blocked-matmul' if LOOP_UNROLLING else 'blocked-matmul-no-unroll'
+
+def ipcSpec(BP, LOOP_UNROLLING, I, J, K, file):
     loop = ' with -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    plt.xlabel('Tamaño de Matriz')
-    plt.ylabel('Porcentaje de Taza de Exito del Predictor de branches')
-    plt.title('Matriz '+ 'Con Caché = 8 Kb'+ ' Y '+ loop)
-    plt.xticks(index + bar_width, matrixsizes)
-    plt.legend()
-    
-    plt.tight_layout()
-    plt.savefig(file)
+    return render.PlotSpec('line', 'cache_size_kb', 'ipc',
+        dict(BP=BP, M_I=I, M_J=J, M_K=K, LOOP_UNROLLING=LOOP_UNROLLING,
+             Benchmark=matmulBenchmark(LOOP_UNROLLING)), file=file,
+        xlabel='Cache Size (Kb)', ylabel='IPC',
+        title=('Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+', '+ BP+ loop))
 
-def plotCacheHit(dataset, LOOP_UNROLLING, I, J, K, file):
-    # data to plot
-    miss_rate = {'LocalBP':{},'BiModeBP':{},'TournamentBP':{}}
-    miss_rate_list = {'LocalBP':[],'BiModeBP':[],'TournamentBP':[]}
-    cachesizes = []
-    #Populate Data
-    for data in dataset:
-        if (data['M_I'] == I and data['M_J'] == J and data['M_K'] == K and data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            #miss = int(data['stats']['system.cpu.branchPred.condPredicted'])/int(data['stats']['system.cpu.branchPred.condIncorrect']) * 100
-            miss = float(data['stats']['system.mem_ctrls.pageHitRate'])
-            miss_rate[data['BP']][float(data['CacheSize'])/1024] = miss
-    cachesizes, miss_rate_list = dictToList (miss_rate, miss_rate_list)
-    # create plot
-    fig, ax = plt.subplots()
-    index = np.arange(len(cachesizes))
-    bar_width = 0.3
-    opacity = 0.8
-    
-    rects1 = plt.bar(index, miss_rate_list['TournamentBP'], bar_width,
-                    alpha=opacity,
-                    color='b',
-                    label='TournamentBP')
-    
-    rects2 = plt.bar(index + bar_width, miss_rate_list['BiModeBP'], bar_width,
-                    alpha=opacity,
-                    color='g',
-                    label='BiModeBP')
-    rects3 = plt.bar(index + bar_width*2, miss_rate_list['LocalBP'], bar_width,
-                    alpha=opacity,
-                    color='r',
-                    label='LocalBP')
+def branchMissSpec(LOOP_UNROLLING, I, J, K, file):
     loop = ' con -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    #ax.set_yscale("log")
-    plt.xlabel('Tamaño Caché (Kb)')
-    plt.ylabel('Taza de Hit de Caché')
-    plt.title('Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+ loop)
-    plt.xticks(index + bar_width, cachesizes)
-    plt.legend(loc = 'center')
-    #leg = plt.legend( loc = 'upper right')
-    plt.tight_layout()
-    plt.savefig(file)
+    return render.PlotSpec('bars', 'cache_size_kb', 'bp_predicted_per_incorrect',
+        dict(M_I=I, M_J=J, M_K=K, LOOP_UNROLLING=LOOP_UNROLLING,
+             Benchmark=matmulBenchmark(LOOP_UNROLLING)), file=file,
+        xlabel='Tamaño Caché (Kb)',
+        ylabel='Porcentaje de Taza de Exito del Predictor de branches',
+        title='Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+ loop)
 
-def plotCacheHit_log(dataset, LOOP_UNROLLING, I, J, K, file):
-    # data to plot
-    miss_rate = {'LocalBP':{},'BiModeBP':{},'TournamentBP':{}}
-    miss_rate_list = {'LocalBP':[],'BiModeBP':[],'TournamentBP':[]}
-    cachesizes = []
-    #Populate Data
-    for data in dataset:
-        if (data['M_I'] == I and data['M_J'] == J and data['M_K'] == K and data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            #miss = int(data['stats']['system.cpu.branchPred.condPredicted'])/int(data['stats']['system.cpu.branchPred.condIncorrect']) * 100
-            miss = float(data['stats']['system.mem_ctrls.pageHitRate'])
-            miss_rate[data['BP']][float(data['CacheSize'])/1024] = miss
-    cachesizes, miss_rate_list = dictToList (miss_rate, miss_rate_list)
-    # create plot
-    fig, ax = plt.subplots()
-    index = np.arange(len(cachesizes))
-    bar_width = 0.3
-    opacity = 0.8
-    
-    rects1 = plt.bar(index, miss_rate_list['TournamentBP'], bar_width,
-                    alpha=opacity,
-                    color='b',
-                    label='TournamentBP')
-    
-    rects2 = plt.bar(index + bar_width, miss_rate_list['BiModeBP'], bar_width,
-                    alpha=opacity,
-                    color='g',
-                    label='BiModeBP')
-    rects3 = plt.bar(index + bar_width*2, miss_rate_list['LocalBP'], bar_width,
-                    alpha=opacity,
-                    color='r',
-                    label='LocalBP')
-    loop = ' con -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    ax.set_yscale("log")
-    plt.xlabel('Tamaño Caché (Kb)')
-    plt.ylabel('Logaritmo de Taza de Hit de Caché')
-    plt.title('Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+ loop)
-    plt.xticks(index + bar_width, cachesizes)
-    plt.legend()
-    #leg = plt.legend( loc = 'upper right')
-    plt.tight_layout()
-    plt.savefig(file)
+def branchMissMatrixSpec(CACHE_SIZE, LOOP_UNROLLING, file):
+    loop = ' with -funroll-loops' if LOOP_UNROLLING else ' no optimization'
+    return render.PlotSpec('bars', 'matrix_label', 'bp_predicted_per_incorrect',
+        dict(CacheSize=CACHE_SIZE, LOOP_UNROLLING=LOOP_UNROLLING,
+             Benchmark=matmulBenchmark(LOOP_UNROLLING)), file=file,
+        xlabel='Tamaño de Matriz',
+        ylabel='Porcentaje de Taza de Exito del Predictor de branches',
+        title='Matriz '+ 'Con Caché = '+str(CACHE_SIZE//1024)+' Kb'+ ' Y '+ loop)
 
-def plotCacheHitMatrix_log(dataset, CACHE_SIZE, LOOP_UNROLLING, file):
-    # data to plot
-    miss_rate = {'LocalBP':{},'BiModeBP':{},'TournamentBP':{}}
-    miss_rate_list = {'LocalBP':[],'BiModeBP':[],'TournamentBP':[]}
-    matrixsizes = []
-    #Populate Data
-    for data in dataset:
-        if (int(data['CacheSize']) == CACHE_SIZE and  data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            matrixsize = str(data['M_I'])+'x'+str(data['M_J'])+'*'+str(data['M_J'])+'x'+str(data['M_K'])
-            miss = float(data['stats']['system.mem_ctrls.pageHitRate'])
-            #miss = int(data['stats']['system.cpu.branchPred.condPredicted'])/int(data['stats']['system.cpu.branchPred.condIncorrect']) * 100
-            miss_rate[data['BP']][matrixsize] = miss
-    matrixsizes, miss_rate_list = dictToList(miss_rate, miss_rate_list)
-    # create plot
-    fig, ax = plt.subplots()
-    index = np.arange(len(matrixsizes))
-    ##leg = plt.legend( loc = 'lower right')
-    bar_width = 0.3
-    opacity = 0.8
-    
-    rects1 = plt.bar(index, miss_rate_list['TournamentBP'], bar_width,
-                    alpha=opacity,
-                    color='b',
-                    label='TournamentBP')
-    
-    rects2 = plt.bar(index + bar_width, miss_rate_list['BiModeBP'], bar_width,
-                    alpha=opacity,
-                    color='g',
-                    label='BiModeBP')
-    rects3 = plt.bar(index + bar_width*2, miss_rate_list['LocalBP'], bar_width,
-                    alpha=opacity,
-                    color='r',
-                    label='LocalBP')
+def cacheHitSpec(LOOP_UNROLLING, I, J, K, file, log=False):
+    loop = ' con -funroll-loops' if LOOP_UNROLLING else ' no optimization'
+    return render.PlotSpec('bars', 'cache_size_kb', 'page_hit_rate',
+        dict(M_I=I, M_J=J, M_K=K, LOOP_UNROLLING=LOOP_UNROLLING,
+             Benchmark=matmulBenchmark(LOOP_UNROLLING)), file=file,
+        scale='log' if log else 'linear',
+        xlabel='Tamaño Caché (Kb)',
+        ylabel='Logaritmo de Taza de Hit de Caché' if log else 'Taza de Hit de Caché',
+        title='Matriz '+str(I)+'x'+str(J)+'*'+str(J)+'x'+str(K)+ loop,
+        legend='best' if log else 'center')
 
+def cacheHitMatrixSpec(CACHE_SIZE, LOOP_UNROLLING, file, log=False):
     loop = ' with -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    ax.set_yscale("log")
-    plt.xlabel('Tamaño de Matriz')
-    plt.ylabel('Logaritmo de Taza de Hit de Caché')
-    plt.title('Matriz '+ 'Con Caché = 8 Kb'+ ' Y '+ loop)
-    plt.xticks(index + bar_width, matrixsizes)
-    plt.legend()
-    
-    plt.tight_layout()
-    plt.savefig(file)
+    return render.PlotSpec('bars', 'matrix_label', 'page_hit_rate',
+        dict(CacheSize=CACHE_SIZE, LOOP_UNROLLING=LOOP_UNROLLING,
+             Benchmark=matmulBenchmark(LOOP_UNROLLING)), file=file,
+        scale='log' if log else 'linear',
+        xlabel='Tamaño de Matriz',
+        ylabel='Logaritmo de Taza de Hit de Caché' if log else 'Taza de Hit de Caché',
+        title='Matriz '+ 'Con Caché = '+str(CACHE_SIZE//1024)+' Kb'+ ' Y '+ loop)
 
-def plotCacheHitMatrix(dataset, CACHE_SIZE, LOOP_UNROLLING, file):
-    # data to plot
-    miss_rate = {'LocalBP':{},'BiModeBP':{},'TournamentBP':{}}
-    miss_rate_list = {'LocalBP':[],'BiModeBP':[],'TournamentBP':[]}
-    matrixsizes = []
-    #Populate Data
-    for data in dataset:
-        if (int(data['CacheSize']) == CACHE_SIZE and  data['LOOP_UNROLLING'] == LOOP_UNROLLING):
-            matrixsize = str(data['M_I'])+'x'+str(data['M_J'])+'*'+str(data['M_J'])+'x'+str(data['M_K'])
-            miss = float(data['stats']['system.mem_ctrls.pageHitRate'])
-            #miss = int(data['stats']['system.cpu.branchPred.condPredicted'])/int(data['stats']['system.cpu.branchPred.condIncorrect']) * 100
-            miss_rate[data['BP']][matrixsize] = miss
-    matrixsizes, miss_rate_list = dictToList(miss_rate, miss_rate_list)
-    # create plot
-    fig, ax = plt.subplots()
-    index = np.arange(len(matrixsizes))
-    ##leg = plt.legend( loc = 'lower right')
-    bar_width = 0.3
-    opacity = 0.8
-    
-    rects1 = plt.bar(index, miss_rate_list['TournamentBP'], bar_width,
-                    alpha=opacity,
-                    color='b',
-                    label='TournamentBP')
-    
-    rects2 = plt.bar(index + bar_width, miss_rate_list['BiModeBP'], bar_width,
-                    alpha=opacity,
-                    color='g',
-                    label='BiModeBP')
-    rects3 = plt.bar(index + bar_width*2, miss_rate_list['LocalBP'], bar_width,
-                    alpha=opacity,
-                    color='r',
-                    label='LocalBP')
+# Las graficas del reporte
+def reportSpecs():
+    I, J, K = MATRIX_BASELINE
+    return [
+        #IPC measurement
+        ipcSpec(BP_BASELINE, LOOP_UNROLLING_BASELINE, I, J, K, 'IPC_loop.png'),
+        ipcSpec(BP_BASELINE, False, I, J, K, 'IPC.png'),
+        #BranchMiss measurement
+        branchMissSpec(LOOP_UNROLLING_BASELINE, I, J, K, 'MissBP_loop.png'),
+        branchMissMatrixSpec(CACHE_SIZE_BASELINE, LOOP_UNROLLING_BASELINE, 'MissBPMatrix_loop.png'),
+        #Caché Hit Measurement
+        #-Related to Caché Size
+        cacheHitSpec(LOOP_UNROLLING_BASELINE, I, J, K, 'CacheHitBP_loop.png'),
+        cacheHitSpec(LOOP_UNROLLING_BASELINE, I, J, K, 'CacheHitBP_log_loop.png', log=True),
+        #-Realted to Matrix Size
+        cacheHitMatrixSpec(CACHE_SIZE_BASELINE, LOOP_UNROLLING_BASELINE, 'CacheHitBPMatrix_loop.png'),
+        cacheHitMatrixSpec(CACHE_SIZE_BASELINE, LOOP_UNROLLING_BASELINE, 'CacheHitBPMatrix_loop_log.png', log=True),
+    ]
 
-    loop = ' with -funroll-loops' if LOOP_UNROLLING else ' no optimization'
-    #ax.set_yscale("log")
-    plt.xlabel('Tamaño de Matriz')
-    plt.ylabel('Taza de Hit de Caché')
-    plt.title('Matriz '+ 'Con Caché = 8 Kb'+ ' Y '+ loop)
-    plt.xticks(index + bar_width, matrixsizes)
-    plt.legend()
-    
-    plt.tight_layout()
-    plt.savefig(file)
+# Todas las graficas por configuracion: IPC de cada predictor y matriz, y
+# predictor/hit de cache por matriz y por tamaño de cache
+def perConfigurationSpecs(table, directory):
+    specs = []
+    matrices = np.stack([table['M_I'], table['M_J'], table['M_K']], axis=1)
+    # los benchmarks que no son matrices tienen M_I = M_J = M_K = 0
+    matrices = np.unique(matrices[matrices[:, 0] > 0], axis=0)
+    for loop in np.unique(table['LOOP_UNROLLING']):
+        loop = bool(loop)
+        suffix = '_loop' if loop else ''
+        for I, J, K in matrices:
+            I, J, K = int(I), int(J), int(K)
+            name = os.path.join(directory, 'M-%d,%d,%d' % (I, J, K))
+            for bp in table.categories['BP']:
+                specs.append(ipcSpec(bp, loop, I, J, K, name + '_IPC_' + bp + suffix + '.png'))
+            specs.append(branchMissSpec(loop, I, J, K, name + '_MissBP' + suffix + '.png'))
+            specs.append(cacheHitSpec(loop, I, J, K, name + '_CacheHitBP' + suffix + '.png'))
+        for cachesize in np.unique(table['CacheSize']):
+            cachesize = int(cachesize)
+            name = os.path.join(directory, 'l1d-%dkB' % (cachesize // 1024))
+            specs.append(branchMissMatrixSpec(cachesize, loop, name + '_MissBPMatrix' + suffix + '.png'))
+            specs.append(cacheHitMatrixSpec(cachesize, loop, name + '_CacheHitBPMatrix' + suffix + '.png'))
+    return specs
 
 def main():
-    dirlist = getFolders(rootdir)
-    dataset = []
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reingest', action='store_true',
+                        help='vuelve a leer todos los folders aunque ya esten en el store')
+    parser.add_argument('--per-config', metavar='DIR',
+                        help='ademas dibuja las graficas de cada configuracion en DIR')
+    parser.add_argument('--render-workers', type=int, default=None,
+                        help='procesos para dibujar, por defecto os.cpu_count()')
+    parser.add_argument('--timeseries', metavar='FOLDER',
+                        help='imprime la serie de tiempo de una corrida con --stats_period y termina')
+    parser.add_argument('--compare', metavar='METRICA',
+                        help='agrupa las corridas repetidas de cada configuracion e imprime '
+                             'media, varianza y speedup contra el baseline con intervalos de 95%%')
+    # para stats que no estan en aggregate.LOWER_IS_BETTER ni HIGHER_IS_BETTER
+    direction = parser.add_mutually_exclusive_group()
+    direction.add_argument('--lower-is-better', dest='lower_is_better', action='store_const',
+                           const=True, default=None,
+                           help='con --compare, un valor menor de la metrica es mas rapido')
+    direction.add_argument('--higher-is-better', dest='lower_is_better', action='store_const',
+                           const=False,
+                           help='con --compare, un valor mayor de la metrica es mas rapido')
+    parser.add_argument('--list-stats', action='store_true',
+                        help='imprime los nombres de todas las stats que se pueden usar con --compare')
+    parser.add_argument('--archive', metavar='FILE',
+                        help='lee las corridas de un archivo de pack.py en vez de ' + rootdir)
+    args = parser.parse_args()
+    if args.timeseries:
+        printTimeseries(args.timeseries)
+        return
 
-    for folder in  dirlist:
-        dataset.append(getTest(folder))
-    print('Total dataset len ' , len(dataset))
+    # el dataset se guarda por columnas en storedir y solo se leen los
+    # folders nuevos o que cambiaron desde la ultima vez (ver ingest)
+    table = ingest(args.archive or rootdir, storedir, args.reingest)
+    print('Total dataset len ' , len(table))
+    baseline = {'BP': BP_BASELINE, 'CacheSize': CACHE_SIZE_BASELINE}
+    # cualquier stat de stats.txt, no solo allowed_stats: las columnas se
+    # leen la primera vez que se usan y quedan guardadas en el store
+    wide = results_store.WideTable(storedir, table)
+    if args.list_stats:
+        for name in wide.names():
+            print(name)
+        return
+    if args.compare:
+        # las copias de una corrida (cache de resultados, --search) cuentan una vez
+        printComparison(aggregate.Comparison(metrics.DerivedMetrics(table, baseline, wide),
+                                             args.compare, baseline, args.lower_is_better,
+                                             hashes=results_store.run_hashes(storedir, table)))
+        return
 
-    ##Print all data
-    # for data in dataset:
-    #     print(data)
-    
-    #IPC measurement
-    plotIPC(dataset, BP_BASELINE, LOOP_UNROLLING_BASELINE, MATRIX_BASELINE[0], MATRIX_BASELINE[1], MATRIX_BASELINE[2], 'IPC_loop.png') # tiene que existir el los folder
-    plotIPC(dataset, BP_BASELINE, False, MATRIX_BASELINE[0], MATRIX_BASELINE[1], MATRIX_BASELINE[2], 'IPC.png') # tiene que existir el los folder
-    #BranchMiss measurement
-    plotBranchMiss(dataset , LOOP_UNROLLING_BASELINE, MATRIX_BASELINE[0], MATRIX_BASELINE[1], MATRIX_BASELINE[2], 'MissBP_loop.png')
-    plotBranchMissMatrix(dataset, CACHE_SIZE_BASELINE, LOOP_UNROLLING_BASELINE,'MissBPMatrix_loop.png')
-    #Caché Hit Measurement
-    #-Related to Caché Size
-    plotCacheHit(dataset , LOOP_UNROLLING_BASELINE, MATRIX_BASELINE[0], MATRIX_BASELINE[1], MATRIX_BASELINE[2], 'CacheHitBP_loop.png')
-    plotCacheHit_log(dataset , LOOP_UNROLLING_BASELINE, MATRIX_BASELINE[0], MATRIX_BASELINE[1], MATRIX_BASELINE[2], 'CacheHitBP_log_loop.png')
-    #-Realted to Matrix Size
-    plotCacheHitMatrix(dataset, CACHE_SIZE_BASELINE, LOOP_UNROLLING_BASELINE,'CacheHitBPMatrix_loop.png')
-    plotCacheHitMatrix_log(dataset, CACHE_SIZE_BASELINE, LOOP_UNROLLING_BASELINE,'CacheHitBPMatrix_loop_log.png')
-    
-main()
\ No newline at end of file
+    # las graficas se dibujan en paralelo (backend Agg); cada proceso carga
+    # el store y calcula las metricas derivadas una sola vez
+    specs = reportSpecs()
+    if args.per_config:
+        specs += perConfigurationSpecs(table, args.per_config)
+    files = render.render_all(specs, storedir, baseline, args.render_workers)
+    print('Rendered', len(files), 'figures')
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -25,6 +25,12 @@ import sys
 import datetime
 import json
 import shutil
+import hashlib
+import time
+import signal
+import traceback
+import ctypes
+import atexit
 # Interface to m5 simulation, implementing in gem5/src
 import m5
 from m5.defines import buildEnv
@@ -34,6 +40,23 @@ from m5.util import addToPath, fatal
 addToPath(os.path.join('configs/common'))
 addToPath(os.path.join('configs'))
 
+# exit cause gem5 reports when max_insts_any_thread is reached
+MAX_INSTS_CAUSE = "a thread reached the max instruction count"
+# exit cause of the instruction stops scheduled by sampled simulation
+SAMPLE_CAUSE = "sample instruction stop"
+# exit cause when m5.simulate() ran for the number of ticks it was given
+LIMIT_CAUSE = "simulate() limit reached"
+# failed runs are moved here, out of the way of gem5_analyser.py
+FAILED_DIR = ".failed"
+# traceback of a simulation child that raised, in its directory
+FAILURE_FILE = "failure.txt"
+# stderr of the child taking a fast-forward checkpoint
+CHECKPOINT_ERR_FILE = "checkpoint.err"
+# prctl option that sends a signal to a process when its parent exits (Linux)
+PR_SET_PDEATHSIG = 1
+# jobs of a --test sweep queued ahead, per simulation that runs at a time
+LOOKAHEAD_PER_JOB = 16
+
 # Utilities included with m5 for configuring common simulations
 # from gem5/configs/common
 import Options
@@ -43,53 +66,487 @@ import MemConfig
 
 ## local functions
 from options  import *
-from utils import eprint
+from utils import eprint, write_json_atomic
+import result_cache
+import sampling
+import sweep
+import search
+import journal
+import timing
+import scheduler
+import work_queue
+import monitor
 
 
 """
 Main function. This is called once at the very bottom of the script.
 """
 def main(options): 
-    if not options.test:
+    if options.queue_role == "worker":
+        run_queue_worker(options)
+    elif not options.test:
         process = create_process(options)
         run_one_simulation(options, process)
     else:
         run_all_simulations(options)
 
 """
-Create multiple forks for all the tests
+Create multiple forks for all the tests. Up to options.jobs simulations
+run at the same time; each one is reaped as soon as it exits.
+
+options.test is either an old style tests.json or a sweep spec (see
+sweep.py). Jobs are generated lazily from it, one at a time.
 """
 def run_all_simulations(options):
     # keep track of tests that were ran
     with open(options.test) as json_file:
         tests = json.load(json_file)
+    jobs, total_tests = sweep.load_jobs(tests)
+    progress = open_journal(options, tests)
     if(options.restart_test):
         print("Restarted tests from zero!")
-        tests["done"] = []
-    if(tests["done"]):
+        progress.reset()
+    if(len(progress)):
         print("Progress found!!!")
-    total_tests = len(tests["Cache_size"]) * len(tests["Predictor"]) * len(tests["Matrix_size"])
-    current  = 0
-    for c in tests["Cache_size"]:
-        for p in tests["Predictor"]:
-            for  m in tests["Matrix_size"]:
-                current += 1
-                UUID = "l1d:" + str(c)+ " BP:" + p + " M:" +str(m["I"]) + "," + str(m["J"]) + "," + str(m["K"])
-                if not (UUID) in tests["done"]: 
-                    options.l1d_size = str(c) +"kB"
-                    options.branch_predictor = p
-                    options.options = ""+ str(m["I"]) + " " + str(m["J"]) + " " + str(m["K"])
-                    process = create_process(options)
-                    res = run_one_simulation(options, process)
-                    tests["done"].append(UUID)
-                    print(UUID,  "  done!")
-                    with open(options.test, 'w') as outfile:  
-                        json.dump(tests, outfile) 
-                else:
-                    print(UUID,  "  exists!")
-                print("######### TEST ", current, " of ", total_tests, " ###############" )
-                
+    state = {"progress": progress, "current": 0, "total": total_tests, "dirs": {},
+             "deferred": sweep.deferred_keys(tests),
+             # failed jobs waiting for their retry: (when, job, timeouts, deferred)
+             "retries": [], "attempts": {}, "failures": [],
+             "quarantined": set() if options.retry_quarantined
+                            else set(progress.keys_with("quarantined"))}
+    if options.search:
+        run_search_simulations(options, jobs, state)
+    elif options.queue_dir:
+        run_queue_coordinator(options, jobs, state)
+    else:
+        run_jobs(options, jobs, state)
+    report_failures(state)
+
+"""
+Progress of options.test is kept in the append-only journal
+<test>.journal. Progress of older runs (the "done" list of a tests.json,
+or <spec>.progress) is imported the first time.
+"""
+def open_journal(options, tests):
+    journal_file = options.test + ".journal"
+    existed = os.path.exists(journal_file)
+    progress = journal.Journal(journal_file)
+    if not existed:
+        done = tests.get("done", [])
+        old_progress_file = options.test + ".progress"
+        if os.path.exists(old_progress_file):
+            with open(old_progress_file) as json_file:
+                done = json.load(json_file)["done"]
+        progress.append([{"key": key, "status": "done"} for key in done])
+    return progress
+
+"""
+Run every job not marked done in state, keeping up to options.jobs
+simulations running at the same time. With skip_done=False jobs already
+done run again (usually as hits of the result cache).
+
+Jobs are started longest predicted first (see scheduler.py) among the
+next options.jobs * LOOKAHEAD_PER_JOB of the sweep, so that the queue
+doesn't hold every job of a large sweep before the first one starts. With
+options.job_timeout, a simulation running longer than that many seconds
+is killed and queued again behind every other job, with twice the time
+limit, up to options.job_requeues times; after that it is recorded as
+"timeout" in the progress journal and the sweep goes on. Jobs the sweep
+lists under "defer" are held back and start after all the others.
+
+A simulation that fails is moved to <directory>/.failed and run again
+after options.retry_backoff seconds (doubling with every failure), up to
+options.retries times; after that the job is quarantined and the sweep
+goes on. Quarantined jobs of earlier runs are skipped.
+"""
+def run_jobs(options, jobs, state, skip_done=True):
+    queue = scheduler.JobQueue(scheduler.CostModel.from_directory(options.directory),
+                               options, apply_settings)
+    jobs = iter(jobs)
+    deferred_jobs = []
+    running = {} # pid -> simulation
+    sweep_status = monitor.SweepStatus(options.directory, state["total"], state["current"])
+    try:
+        while True:
+            fill_queue(options, queue, jobs, deferred_jobs, state, skip_done,
+                       options.jobs * LOOKAHEAD_PER_JOB)
+            if not (queue or running or state["retries"]):
+                break
+            now = time.time()
+            for retry in [retry for retry in state["retries"] if retry[0] <= now]:
+                state["retries"].remove(retry)
+                when, job, timeouts, deferred = retry
+                queue.push(job, timeouts, deferred)
+            while queue and len(running) < options.jobs:
+                job, job_options, timeouts, deferred, predicted_s = queue.pop()
+                process = create_process(job_options)
+                sim = start_one_simulation(job_options, process)
+                sim["UUID"] = job.key
+                sim["settings"] = job.settings
+                sim["job"] = job
+                sim["timeouts"] = timeouts
+                sim["deferred"] = deferred
+                if sim["pid"] is None:
+                    if "exit_status" in sim:
+                        failed_simulation(state, sim, sim["exit_status"])
+                    else:
+                        record_done(state, sim)
+                    continue
+                sim["predicted_s"] = predicted_s
+                if options.job_timeout:
+                    sim["deadline"] = sim["start"] + options.job_timeout * 2 ** timeouts
+                running[sim["pid"]] = sim
+            sweep_status.update(state["current"], running)
+            # wake up for the next retry if it has a free slot to run in
+            wake = None
+            if state["retries"] and len(running) < options.jobs:
+                wake = min(retry[0] for retry in state["retries"])
+            if running:
+                reap_one_simulation(state, running, queue, wake)
+            elif wake:
+                time.sleep(max(0.0, wake - time.time()))
+    finally:
+        sweep_status.close()
+
+"""
+Push the next jobs of the iterator jobs to queue until it holds size jobs,
+skipping those already done or quarantined unless skip_done is False.
+Deferred jobs go to the list deferred_jobs instead and are pushed once
+jobs is exhausted.
+"""
+def fill_queue(options, queue, jobs, deferred_jobs, state, skip_done, size):
+    while len(queue) < size:
+        job = next(jobs, None)
+        if job is None:
+            for job in deferred_jobs:
+                queue.push(job, deferred=True)
+            del deferred_jobs[:]
+            return
+        if skip_done and job.key in state["progress"]:
+            state["current"] += 1
+            print(job.key,  "  exists!")
+            print("######### TEST ", state["current"], " of ", state["total"], " ###############" )
+            continue
+        if skip_done and job.key in state["quarantined"]:
+            state["current"] += 1
+            print(job.key,  "  quarantined, skipped")
+            continue
+        # the options of the job are only made when it starts; the first
+        # fill sees a job of every grid (see sweep.iter_jobs)
+        check_settings(options, job.settings)
+        if job.key in state["deferred"]:
+            deferred_jobs.append(job)
+        else:
+            queue.push(job)
+
+"""
+Coordinator of a distributed sweep: publish every job that is not done yet
+to the work queue in options.queue_dir and record the results the workers
+report until the queue is drained. Leases of dead workers are reclaimed
+on the way (see work_queue.py).
+"""
+def run_queue_coordinator(options, jobs, state):
+    queue = work_queue.WorkQueue(options.queue_dir)
+    queue.start_publishing()
+    published = 0
+    # workers simulate with these instead of their own options
+    shared = shared_options(options)
+    # queue files of the jobs of this sweep; other results are stale
+    names = set()
+    for seq, job in enumerate(jobs):
+        if job.key in state["progress"] or job.key in state["quarantined"]:
+            state["current"] += 1
+            continue
+        if job.key in state["deferred"]:
+            # claimed in name order, after every job that is not deferred
+            seq += state["total"]
+        names.add(work_queue.job_name(seq, job.key))
+        if queue.publish(seq, job.key, job.settings, shared):
+            published += 1
+    queue.finish_publishing()
+    print("Published ", published, " jobs to ", options.queue_dir)
+    seen = set()
+    while True:
+        reclaimed = queue.reclaim(options.lease_timeout)
+        if reclaimed:
+            eprint("Reclaimed %d expired leases" % reclaimed)
+        for result in queue.new_results(seen, names):
+            record_result(state, result)
+        if queue.drained():
+            break
+        time.sleep(min(1.0, options.lease_timeout / 3))
+    # results that arrived after the last poll
+    for result in queue.new_results(seen, names):
+        record_result(state, result)
+
+"""
+Record a job a queue worker finished, as done or quarantined.
+"""
+def record_result(state, result):
+    if result["key"] in state["progress"]:
+        return
+    if result.get("failed"):
+        quarantine(state, result["key"], result["reason"], result["dir"], result["attempts"])
+    else:
+        record_done(state, {"UUID": result["key"], "dir": result["dir"]})
+
+"""
+Worker of a distributed sweep: claim jobs from the work queue in
+options.queue_dir one at a time and simulate them into options.directory,
+renewing the lease while the simulation runs. Exits once the coordinator
+has published every job and none is left pending or leased.
+"""
+def run_queue_worker(options):
+    queue = work_queue.WorkQueue(options.queue_dir)
+    worker = work_queue.worker_id()
+    beat = options.lease_timeout / 3
+    while True:
+        queue.reclaim(options.lease_timeout)
+        lease = queue.claim(worker)
+        if lease is None:
+            if queue.drained():
+                break
+            time.sleep(min(1.0, beat))
+            continue
+        print(worker, " running ", lease.job["key"])
+        result = run_leased_job(options, queue, lease, beat)
+        result["worker"] = worker
+        queue.complete(lease, result)
+
+"""
+Simulate the job of lease, renewing it every beat seconds, and return the
+result to complete it with. A failed simulation is retried up to
+options.retries times with backoff; the result of the last failure has
+"failed" set and the coordinator quarantines the job.
+"""
+def run_leased_job(options, queue, lease, beat):
+    # the coordinator's options, then the settings of the job
+    job_options = apply_settings(options, dict(lease.job.get("options", {}),
+                                               **lease.job["settings"]))
+    set_checkpoint_dir(job_options)
+    attempt = 0
+    while True:
+        process = create_process(job_options)
+        sim = start_one_simulation(job_options, process, wait_checkpoint=lambda pid:
+            wait_with_heartbeat(queue, lease, beat, {"pid": pid})[1])
+        sim["UUID"] = lease.job["key"]
+        sim["settings"] = lease.job["settings"]
+        if sim["pid"] is not None:
+            if job_options.job_timeout:
+                # twice the limit after every attempt, as run_jobs does
+                sim["deadline"] = sim["start"] + job_options.job_timeout * 2 ** attempt
+            exited_pid, exit_status, rusage = wait_with_heartbeat(queue, lease, beat, sim)
+            monitor.remove_status(sim["dir"])
+            if finish_simulation(job_options, sim, exit_status, rusage):
+                return {"dir": sim["dir"]}
+        elif "exit_status" in sim:
+            exit_status = sim["exit_status"]
+        else:
+            return {"dir": sim["dir"]}
+        failed_dir = keep_failed(job_options, sim["dir"])
+        reason = "timed out" if sim.get("killed") else exit_description(exit_status)
+        attempt += 1
+        if attempt > options.retries:
+            eprint("%s failed (%s), quarantined, see %s" % (sim["UUID"], reason, failed_dir))
+            return {"dir": failed_dir, "failed": True, "reason": reason, "attempts": attempt}
+        eprint("%s failed (%s), retrying" % (sim["UUID"], reason))
+        wait_with_heartbeat(queue, lease, beat, until=time.time() + retry_delay(options, attempt))
+
+"""
+Renew lease every beat seconds while waiting for the child of sim to exit
+(returns what os.wait4 does; the child is killed at sim["deadline"] if
+set) or, without a sim, until time until.
+"""
+def wait_with_heartbeat(queue, lease, beat, sim=None, until=None):
+    while True:
+        if sim is not None:
+            exited_pid, exit_status, rusage = os.wait4(sim["pid"], os.WNOHANG)
+            if exited_pid:
+                return exited_pid, exit_status, rusage
+            if not sim.get("killed") and time.time() >= sim.get("deadline", float("inf")):
+                eprint("Killing %s after %.0f s" % (sim["UUID"], time.time() - sim["start"]))
+                os.kill(sim["pid"], signal.SIGKILL)
+                sim["killed"] = True
+        elif time.time() >= until:
+            return None
+        if (not lease.lost and time.time() - lease.last_beat >= beat
+                and not queue.heartbeat(lease)):
+            eprint("Lease of %s expired, another worker may run it too" % lease.job["key"])
+        time.sleep(0.2)
+
+"""
+--search: bisect the sweep along options.search_axis and only simulate
+the points needed to resolve options.search_metric to options.search_tol.
+Points that were skipped get an interpolated estimate in
+<directory>/search_results.json.
+"""
+def run_search_simulations(options, jobs, state):
+    def run_wave(wave_jobs):
+        state["total"] = state["current"] + len(wave_jobs)
+        run_jobs(options, wave_jobs, state, skip_done=False)
+        return state["dirs"]
+    summary = search.run_search(list(jobs), options.search_axis, options.search_metric,
+                                options.search_tol, run_wave)
+    simulated = sum(group["simulated"] for group in summary)
+    total = sum(group["total"] for group in summary)
+    print("Search simulated ", simulated, " of ", total, " points")
+    write_json_atomic(os.path.join(options.directory, "search_results.json"),
+                      {"axis": options.search_axis, "metric": options.search_metric,
+                       "tolerance": options.search_tol, "groups": summary})
+
+"""
+Wait for any running simulation to exit and record it as done in the
+progress journal. Simulations past their deadline are killed while
+waiting; those are pushed back to queue or recorded as timed out.
+Simulations that failed are retried or quarantined (see failed_simulation).
+Returns early, without reaping anything, at time wake if given.
+"""
+def reap_one_simulation(state, running, queue, wake=None):
+    exited_pid, exit_status, rusage = wait_for_simulation(running, wake)
+    if not exited_pid:
+        return
+    sim = running.pop(exited_pid)
+    monitor.remove_status(sim["dir"])
+    if sim.get("killed"):
+        timed_out_simulation(state, sim, queue, exit_status, rusage)
+        return
+    if finish_simulation(sim["options"], sim, exit_status, rusage):
+        record_done(state, sim)
+    else:
+        failed_simulation(state, sim, exit_status)
+
+"""
+os.wait4 for any child, killing children that run past their deadline.
+At time wake, returns pid 0 if no child exited.
+"""
+def wait_for_simulation(running, wake=None):
+    deadlines = [sim["deadline"] for sim in running.values()
+                    if "deadline" in sim and not sim.get("killed")]
+    if not deadlines and wake is None:
+        return os.wait4(-1, 0)
+    while True:
+        exited_pid, exit_status, rusage = os.wait4(-1, os.WNOHANG)
+        if exited_pid:
+            return exited_pid, exit_status, rusage
+        now = time.time()
+        if wake is not None and now >= wake:
+            return 0, 0, None
+        for sim in running.values():
+            if not sim.get("killed") and sim.get("deadline", now + 1) <= now:
+                eprint("Killing %s after %.0f s" % (sim["UUID"], now - sim["start"]))
+                os.kill(sim["pid"], signal.SIGKILL)
+                sim["killed"] = True
+        time.sleep(0.2)
+
+def timed_out_simulation(state, sim, queue, exit_status, rusage):
+    options = sim["options"]
+    record = timing.run_record(sim["dir"], exit_status, rusage, time.time() - sim["start"])
+    record.update(key=sim["UUID"], settings=sim["settings"], cmd=options.cmd,
+                  options=options.options, timed_out=True)
+    timing.append_record(os.path.join(options.directory, timing.METRICS_FILE), record)
+    failed_dir = keep_failed(options, sim["dir"])
+    if sim["timeouts"] < options.job_requeues:
+        print(sim["UUID"], "  timed out, queued again")
+        queue.push(sim["job"], sim["timeouts"] + 1, sim["deferred"])
+        return
+    state["current"] += 1
+    state["progress"].record(sim["UUID"], "timeout", dir=failed_dir)
+    state["failures"].append({"key": sim["UUID"], "reason": "timed out", "dir": failed_dir,
+                              "attempts": sim["timeouts"] + 1})
+    print(sim["UUID"], "  timed out!")
+    print("######### TEST ", state["current"], " of ", state["total"], " ###############" )
+
+"""
+Keep the directory of a simulation that failed and run it again after a
+backoff, or quarantine the job once it failed options.retries + 1 times.
+"""
+def failed_simulation(state, sim, exit_status):
+    options = sim["options"]
+    failed_dir = keep_failed(options, sim["dir"])
+    reason = exit_description(exit_status)
+    attempt = state["attempts"].get(sim["UUID"], 0) + 1
+    state["attempts"][sim["UUID"]] = attempt
+    if attempt <= options.retries:
+        delay = retry_delay(options, attempt)
+        print(sim["UUID"], "  failed (%s), retrying in %g s" % (reason, delay))
+        state["retries"].append((time.time() + delay, sim["job"], sim["timeouts"],
+                                 sim["deferred"]))
+        return
+    quarantine(state, sim["UUID"], reason, failed_dir, attempt)
 
+"""
+Record a job that failed every attempt as quarantined in the progress
+journal; later sweeps skip it unless options.retry_quarantined.
+"""
+def quarantine(state, key, reason, failed_dir, attempts):
+    state["current"] += 1
+    state["progress"].record(key, "quarantined", dir=failed_dir, reason=reason,
+                             attempts=attempts)
+    state["failures"].append({"key": key, "reason": reason, "dir": failed_dir,
+                              "attempts": attempts})
+    print(key, "  failed (%s), quarantined!" % reason)
+    print("######### TEST ", state["current"], " of ", state["total"], " ###############" )
+
+"""
+Seconds to wait before running a job again after its attempt-th failure.
+"""
+def retry_delay(options, attempt):
+    return options.retry_backoff * 2 ** (attempt - 1)
+
+"""
+Move the directory of a failed simulation, with its program.err and
+partial stats, to <directory>/.failed and return its new path.
+"""
+def keep_failed(options, the_dir):
+    failed_dir = os.path.join(options.directory, FAILED_DIR)
+    os.makedirs(failed_dir, exist_ok=True)
+    new_dir = os.path.join(failed_dir, os.path.basename(the_dir))
+    # a retry can start in the same second as the attempt before it
+    unique_dir = new_dir
+    n = 1
+    while os.path.exists(unique_dir):
+        n += 1
+        unique_dir = new_dir + "-" + str(n)
+    os.rename(the_dir, unique_dir)
+    return unique_dir
+
+"""
+"exit code N" or "killed by SIGNAME" for a status returned by os.wait4.
+"""
+def exit_description(exit_status):
+    if os.WIFSIGNALED(exit_status):
+        number = os.WTERMSIG(exit_status)
+        try:
+            return "killed by " + signal.Signals(number).name
+        except ValueError:
+            return "killed by signal %d" % number
+    return "exit code %d" % os.WEXITSTATUS(exit_status)
+
+"""
+Print the jobs of this sweep that failed, with the end of their error
+output.
+"""
+def report_failures(state, lines=5):
+    if not state["failures"]:
+        return
+    eprint("%d of %d jobs failed:" % (len(state["failures"]), state["total"]))
+    for failure in state["failures"]:
+        eprint("  %s: %s after %d attempts, see %s" % (failure["key"], failure["reason"],
+                                                      failure["attempts"], failure["dir"]))
+        for name in [FAILURE_FILE, CHECKPOINT_ERR_FILE, "program.err"]:
+            path = os.path.join(failure["dir"], name)
+            if os.path.exists(path) and os.path.getsize(path):
+                with open(path, errors="replace") as f:
+                    for line in f.readlines()[-lines:]:
+                        eprint("    " + line.rstrip())
+                break
+
+def record_done(state, sim):
+    state["current"] += 1
+    state["dirs"][sim["UUID"]] = sim["dir"]
+    state["progress"].record(sim["UUID"], "done", dir=sim["dir"])
+    print(sim["UUID"],  "  done!")
+    print("######### TEST ", state["current"], " of ", state["total"], " ###############" )
 
 """
 Create a virtual CPU for the simulation.
@@ -114,6 +571,16 @@ def create_cpu(options, cpu_id):
     the_cpu[cpu_id].createInterruptController()
     return the_cpu
 
+"""
+Create the CPU used to fast-forward to the checkpoint. It stops after
+options.fast_forward instructions.
+"""
+def create_fast_forward_cpu(options, cpu_id):
+    the_cpu = AtomicSimpleCPU(cpu_id=cpu_id)
+    the_cpu.max_insts_any_thread = int(options.fast_forward)
+    the_cpu.createInterruptController()
+    return the_cpu
+
 """
 Create a representation of the program to run for gem5. The
 supplied version expects you to run this script with --cmd
@@ -146,37 +613,258 @@ Based on options, fork a child process and run one simulation in it.
 Uses the create_cpu function above.
 """
 def run_one_simulation(options, process):
-    the_dir = os.path.join(options.directory + "/l1d-" 
+    sim = start_one_simulation(options, process)
+    if sim["pid"] is not None:
+        # in parent
+        exited_pid, exit_status, rusage = os.wait4(sim["pid"], 0)
+        monitor.remove_status(sim["dir"])
+        succeeded = finish_simulation(options, sim, exit_status, rusage)
+    elif "exit_status" in sim:
+        exit_status = sim["exit_status"]
+        succeeded = False
+    else:
+        return
+    if not succeeded:
+        failed_dir = keep_failed(options, sim["dir"])
+        eprint("Simulation failed (%s), see %s" % (exit_description(exit_status), failed_dir))
+        sys.exit(1)
+
+"""
+Fork a child process that runs one simulation and return without waiting
+for it. Returns a dict with the pid of the child and its output directory.
+
+If the result cache already holds this exact configuration the cached
+files are linked into the new directory instead and pid is None. pid is
+also None if the fast-forward checkpoint could not be taken; exit_status
+is then the status of the checkpoint child, whose output is in the
+directory.
+
+wait_checkpoint, given the pid of the checkpoint child, waits for it and
+returns its exit status; queue workers pass one that renews their lease.
+"""
+def start_one_simulation(options, process, wait_checkpoint=None):
+    sim = {"pid": None, "dir": None, "cache_key": None, "options": options}
+    if options.result_cache:
+        sim["cache_key"] = result_cache.config_key(options)
+        cached_dir = result_cache.lookup(options.result_cache, sim["cache_key"])
+        if cached_dir:
+            sim["dir"] = make_run_dir(options)
+            result_cache.restore(cached_dir, sim["dir"])
+            print("Reusing cached result from", cached_dir)
+            return sim
+    if options.fast_forward:
+        restore_checkpoint, exit_status = ensure_checkpoint(options, process, wait_checkpoint)
+        if exit_status is not None:
+            # the run failed, with what the checkpoint child left behind
+            sim["dir"] = make_run_dir(options)
+            for name in os.listdir(restore_checkpoint):
+                os.rename(os.path.join(restore_checkpoint, name), os.path.join(sim["dir"], name))
+            os.rmdir(restore_checkpoint)
+            sim["exit_status"] = exit_status
+            return sim
+    else:
+        restore_checkpoint = None
+    # only now, so that no empty directory is left if the checkpoint fails
+    the_dir = make_run_dir(options)
+    sim["dir"] = the_dir
+    # don't let the child re-print whatever the parent still has buffered
+    sys.stdout.flush()
+    sys.stderr.flush()
+    parent = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        # in child
+        os.chdir(the_dir)
+        die_with_parent(parent, the_dir)
+        run_child(lambda: run_system_with_cpu(process, options, os.path.realpath("."),
+            real_cpu_create_function=lambda cpu_id: create_cpu(options, cpu_id),
+            restore_checkpoint=restore_checkpoint
+        ))
+    sim["pid"] = pid
+    sim["start"] = time.time()
+    return sim
+
+"""
+Create the output directory of a simulation of options and return its path.
+"""
+def make_run_dir(options):
+    the_dir = os.path.join(options.directory + "/" + os.path.basename(options.cmd) + "_l1d-" 
                         + options.l1d_size+ "_BP-" + options.branch_predictor + "_M-" + options.options.replace(" ", ",") + "_" +
                         datetime.datetime.now().strftime("%m-%d-%Hh%Mm%Ss") )
-    if not os.path.exists(the_dir):
-        os.makedirs(the_dir)
+    # runs that only differ in other fields can start in the same second
+    unique_dir = the_dir
+    n = 1
+    while os.path.exists(unique_dir):
+        n += 1
+        unique_dir = the_dir + "-" + str(n)
+    os.makedirs(unique_dir)
+    return unique_dir
+
+"""
+Return (checkpoint directory, None) for the program and arguments in
+options, creating the checkpoint first if needed. If it can't be taken,
+returns (directory with the output of the child that tried, its exit
+status) instead. wait_checkpoint is as for start_one_simulation.
+
+The checkpoint is taken after options.fast_forward instructions on an
+AtomicSimpleCPU, so it only depends on the executable, its arguments and
+the memory configuration. Every cache/predictor variant of the same program
+and arguments restores the same checkpoint and only simulates what comes
+after it on the detailed CPU.
+"""
+def ensure_checkpoint(options, process, wait_checkpoint=None):
+    cpt_dir = os.path.join(options.checkpoint_dir, checkpoint_key(options))
+    if os.path.exists(os.path.join(cpt_dir, "m5.cpt")):
+        return cpt_dir, None
+    # taken in a directory of its own and renamed into place once complete,
+    # so queue workers sharing checkpoint_dir never see half a checkpoint
+    tmp_dir = "%s.tmp.%s" % (cpt_dir, work_queue.worker_id())
+    os.makedirs(tmp_dir)
+    eprint("Taking checkpoint after %s instructions in %s" % (options.fast_forward, cpt_dir))
+    sys.stdout.flush()
+    sys.stderr.flush()
+    parent = os.getpid()
     pid = os.fork()
     if pid == 0:
         # in child
-        os.chdir(the_dir)
-        run_system_with_cpu(process, options, os.path.realpath("."),
-            real_cpu_create_function=lambda cpu_id: create_cpu(options, cpu_id)
-        )
-        sys.exit(0)
+        os.chdir(tmp_dir)
+        die_with_parent(parent, tmp_dir)
+        # kept with the failed run if the checkpoint can't be taken
+        err = os.open(CHECKPOINT_ERR_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(err, sys.stderr.fileno())
+        run_child(lambda: run_system_with_cpu(process, options, os.path.realpath("."),
+            real_cpu_create_function=lambda cpu_id: create_fast_forward_cpu(options, cpu_id),
+            save_checkpoint=os.path.realpath(".")
+        ))
+    if wait_checkpoint is not None:
+        exit_status = wait_checkpoint(pid)
     else:
-        # in parent
         exited_pid, exit_status = os.waitpid(pid, 0)
-        # Check whether child reached exit(0)
-        if os.WIFEXITED(exit_status) and os.WEXITSTATUS(exit_status) != 0:
-            eprint("Child did not exit normally")
-            sys.exit(1)
+    if not child_succeeded(exit_status):
+        eprint("Could not take checkpoint (%s)" % exit_description(exit_status))
+        return tmp_dir, exit_status
+    try:
+        os.rename(tmp_dir, cpt_dir)
+    except OSError:
+        # another worker took the same checkpoint meanwhile
+        if not os.path.exists(os.path.join(cpt_dir, "m5.cpt")):
+            raise
+        shutil.rmtree(tmp_dir)
+    return cpt_dir, None
+
+"""
+Make a forked child get SIGTERM once parent exits, for example when a
+queue worker is killed, instead of simulating on with no one to wait for
+it. The job runs again elsewhere, so the child then removes its status
+file and the_dir and exits. Python only handles the signal between the
+slices of simulate_with_status, so that can take a status interval.
+"""
+def die_with_parent(parent, the_dir):
+    def on_term(signum, frame):
+        if os.getppid() == parent:
+            # not from the parent exiting, so die of it as usual
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        monitor.remove_status(the_dir)
+        os.chdir("/")
+        shutil.rmtree(the_dir, ignore_errors=True)
+        os._exit(1)
+    signal.signal(signal.SIGTERM, on_term)
+    try:
+        ctypes.CDLL(None).prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+    except (OSError, AttributeError):
+        # not Linux; the child outlives its parent as before
+        return
+    # the parent may have exited before prctl
+    if os.getppid() != parent:
+        on_term(signal.SIGTERM, None)
+
+"""
+Body of a forked child: call simulate() and exit with status 0, with the
+status simulate() passed to sys.exit, or with 1 after writing the
+traceback to FAILURE_FILE if it raised.
+
+The child leaves with os._exit, so that it never unwinds through the
+frames it inherited from the parent (the sweep loop, its status file and
+journal) and runs their cleanup a second time.
+"""
+def run_child(simulate):
+    code = 0
+    try:
+        simulate()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        # kept with the run for report_failures
+        with open(FAILURE_FILE, "w") as f:
+            traceback.print_exc(file=f)
+        traceback.print_exc()
+        code = 1
+    # gem5 registers its exit cleanup (closing its output files) with atexit
+    atexit._run_exitfuncs()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+"""
+Checkpoints are shared between runs that only differ in the CPU and
+caches, so the key leaves those out.
+"""
+def checkpoint_key(options):
+    config = {name: getattr(options, name, None) for name in
+                ["options", "input", "fast_forward", "mem_type", "mem_size",
+                 "mem_channels", "mem_ranks", "cacheline_size"]}
+    config["executable"] = result_cache.file_hash(os.path.realpath(options.cmd))
+    blob = json.dumps(config, sort_keys=True, default=str)
+    return os.path.basename(options.cmd) + "-" + hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+"""
+Parent-side bookkeeping once the child of a simulation has exited. rusage
+is the resource usage of the child as returned by os.wait4; it is logged
+with the timings of the child to <directory>/metrics.jsonl.
+
+Returns False if the child failed; its directory is left as it is.
+"""
+def finish_simulation(options, sim, exit_status, rusage):
+    record = timing.run_record(sim["dir"], exit_status, rusage, time.time() - sim["start"])
+    record["key"] = sim.get("UUID")
+    record["settings"] = sim.get("settings") or {
+        "l1d_size": options.l1d_size, "branch_predictor": options.branch_predictor,
+        "options": options.options}
+    record["cmd"] = options.cmd
+    record["options"] = options.options
+    timing.append_record(os.path.join(options.directory, timing.METRICS_FILE), record)
+    # Check whether child reached exit(0)
+    if not child_succeeded(exit_status):
+        eprint("Child did not exit normally")
+        return False
+    if options.sample_window:
+        sampling.write_summary(sim["dir"])
+    if sim["cache_key"]:
+        result_cache.store(options.result_cache, sim["cache_key"], sim["dir"])
+    return True
+
+"""
+True if a status returned by os.wait4/os.waitpid is a clean exit(0).
+"""
+def child_succeeded(exit_status):
+    return os.WIFEXITED(exit_status) and os.WEXITSTATUS(exit_status) == 0
 
 """
 Setup a simulation to run the specified program, writing output to the specified output directory.
 
 Optionally supports running with a different (faster) CPU for the first instrunctions.
+The system can also start from restore_checkpoint instead of a cold start,
+or stop and write a checkpoint to save_checkpoint instead of dumping stats.
 """
 def run_system_with_cpu(
         process, options, output_dir,
         warmup_cpu_class=None,
         warmup_instructions=0,
-        real_cpu_create_function=lambda cpu_id: DerivO3CPU(cpu_id=cpu_id)):
+        real_cpu_create_function=lambda cpu_id: DerivO3CPU(cpu_id=cpu_id),
+        restore_checkpoint=None,
+        save_checkpoint=None):
     m5.options.outdir = output_dir
     m5.core.setOutputDir(m5.options.outdir)
 
@@ -220,6 +908,17 @@ def run_system_with_cpu(
             cpu.switched_out = True
             cpu.createThreads()
         system.switch_cpus = real_cpus
+    if options.sample_window:
+        # functional CPU for the stretches between detailed windows. It
+        # takes over the caches of the detailed CPU, so they stay warm.
+        fast_cpus = [AtomicSimpleCPU(cpu_id=0)]
+        for cpu in fast_cpus:
+            cpu.clk_domain = system.cpu_clk_domain
+            cpu.workload = process
+            cpu.system = system
+            cpu.switched_out = True
+            cpu.createThreads()
+        system.switch_cpus = fast_cpus
 
     for cpu in system.cpu:
         cpu.clk_domain = system.cpu_clk_domain
@@ -236,22 +935,140 @@ def run_system_with_cpu(
     root = Root(full_system = False, system = system)
 
     m5.options.outdir = output_dir
-    m5.instantiate(None) # None == no checkpoint
+    if restore_checkpoint:
+        eprint("Restoring from checkpoint %s" % (restore_checkpoint))
+    timer = timing.PhaseTimer()
+    timer.start("instantiate")
+    m5.instantiate(restore_checkpoint) # None == no checkpoint
+    timer.stop("instantiate")
+    timer.start("simulate")
+    status = None
+    if options.status_interval and not save_checkpoint:
+        status_cpus = list(system.cpu)
+        if warmup_cpu_class:
+            status_cpus += real_cpus
+        if options.sample_window:
+            status_cpus += fast_cpus
+        status = monitor.StatusWriter(output_dir, options, status_cpus,
+                                      options.status_interval, m5.curTick())
     if warmup_cpu_class:
         eprint("Running warmup with warmup CPU class (%d instrs.)" % (warmup_instructions))
     eprint("Starting simulation")
-    exit_event = m5.simulate(max_tick)
+    if options.sample_window:
+        exit_event = simulate_sampled(system, options, max_tick, status)
+    elif options.stats_period or options.stats_period_insts:
+        exit_event = simulate_periodic(system, options, max_tick, status)
+    else:
+        exit_event = simulate_with_status(max_tick, status)
     if warmup_cpu_class:
         max_tick -= m5.curTick()
         m5.stats.reset()
         # debug_print("Finished warmup; running real simulation")
         m5.switchCpus(system, real_cpus)
-        exit_event = m5.simulate(max_tick)
+        exit_event = simulate_with_status(max_tick, status)
+    timer.stop("simulate")
+    timer.save(output_dir)
     eprint("Done simulation @ tick = %s: %s  with exit code %d." % (m5.curTick(), exit_event.getCause(), exit_event.getCode()))
     print("#####Finished %s %s", options.cmd, options.options)
+    if save_checkpoint:
+        if exit_event.getCause() != MAX_INSTS_CAUSE:
+            eprint("Program ended before the fast-forward point, no checkpoint taken")
+            sys.exit(1)
+        m5.checkpoint(save_checkpoint)
+        return
+    if not (options.sample_window or options.stats_period or options.stats_period_insts):
+        # sampled and periodic runs already dumped one block per window;
+        # also dumped when the program failed, to keep its partial stats
+        m5.stats.dump()
     if (exit_event.getCode() != 0):
-        shutil.rmtree(m5.options.outdir)
+        eprint("Program exited with code %d" % exit_event.getCode())
         sys.exit(1)
-    m5.stats.dump()
+
+"""
+Sampled simulation: alternate detailed windows of options.sample_window
+instructions (after options.sample_warmup instructions of detailed warmup)
+with options.sample_interval instructions of functional execution, until
+the program exits. Stats are reset before and dumped after every window,
+so stats.txt ends up with one block per window; sampling.json records how
+many instructions ran in total so the windows can be extrapolated.
+"""
+def simulate_sampled(system, options, max_tick, status):
+    detailed_cpus = system.cpu
+    fast_cpus = system.switch_cpus
+    windows = 0
+    while True:
+        if options.sample_warmup:
+            exit_event = simulate_insts(detailed_cpus[0], options.sample_warmup, max_tick, status)
+            if exit_event.getCause() != SAMPLE_CAUSE:
+                break
+        m5.stats.reset()
+        exit_event = simulate_insts(detailed_cpus[0], options.sample_window, max_tick, status)
+        m5.stats.dump()
+        windows += 1
+        if exit_event.getCause() != SAMPLE_CAUSE:
+            break
+        m5.switchCpus(system, list(zip(detailed_cpus, fast_cpus)))
+        exit_event = simulate_insts(fast_cpus[0], options.sample_interval, max_tick, status)
+        if exit_event.getCause() != SAMPLE_CAUSE:
+            break
+        m5.switchCpus(system, list(zip(fast_cpus, detailed_cpus)))
+    total_insts = sum(cpu.totalInsts() for cpu in detailed_cpus + fast_cpus)
+    eprint("Sampled %d windows out of %d instructions" % (windows, total_insts))
+    with open(os.path.join(m5.options.outdir, sampling.SAMPLING_FILE), 'w') as outfile:
+        json.dump({"windows": windows,
+                   "window": options.sample_window,
+                   "warmup": options.sample_warmup,
+                   "interval": options.sample_interval,
+                   "total_insts": total_insts}, outfile)
+    return exit_event
+
+"""
+Periodic stats: dump and reset the stats every options.stats_period ticks
+or options.stats_period_insts instructions, so stats.txt ends up with one
+block per period (the last one covers whatever ran after the last full
+period) and shows how the program behaves over time.
+"""
+def simulate_periodic(system, options, max_tick, status):
+    periods = 0
+    while True:
+        if options.stats_period_insts:
+            exit_event = simulate_insts(system.cpu[0], options.stats_period_insts, max_tick,
+                                        status)
+            period_end = exit_event.getCause() == SAMPLE_CAUSE
+        else:
+            exit_event = simulate_with_status(min(options.stats_period, max_tick - m5.curTick()),
+                                              status)
+            period_end = exit_event.getCause() == LIMIT_CAUSE and m5.curTick() < max_tick
+        m5.stats.dump()
+        periods += 1
+        if not period_end:
+            break
+        m5.stats.reset()
+    eprint("Dumped stats for %d periods" % (periods))
+    return exit_event
+
+"""
+Run cpu for insts more instructions (or until something else stops the
+simulation first).
+"""
+def simulate_insts(cpu, insts, max_tick, status):
+    cpu.scheduleInstStop(0, insts, SAMPLE_CAUSE)
+    return simulate_with_status(max_tick - m5.curTick(), status)
+
+"""
+m5.simulate(ticks), in slices of status.chunk ticks with a progress update
+after each one so that monitor.py can follow the simulation. Returns the
+exit event a single m5.simulate(ticks) would have returned; instruction
+stops scheduled before the call stay pending across the slices.
+"""
+def simulate_with_status(ticks, status):
+    if status is None:
+        return m5.simulate(ticks)
+    end = m5.curTick() + ticks
+    while True:
+        exit_event = m5.simulate(min(status.chunk, end - m5.curTick()))
+        status.update(m5.curTick())
+        if exit_event.getCause() != LIMIT_CAUSE or m5.curTick() >= end:
+            return exit_event
 
 main(get_options(Options))
@@ -0,0 +1,83 @@
+"""
+Append-only progress journal for sweeps.
+
+Every finished job appends one JSON line ({"key": ..., "status": ...}) that
+is fsync'd before the call returns, so a crash can lose at most the record
+being written and never the ones before it. Appends take an exclusive
+flock, which makes the journal safe to share between several processes
+(or hosts, on filesystems with working locks). On open, the file is read
+once into a dict index; a truncated last line from a crash is skipped.
+"""
+import fcntl
+import json
+import os
+
+class Journal(object):
+    def __init__(self, path):
+        self.path = path
+        self.status = {} # key -> status of its last record
+        self.records = {} # key -> last record
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        """Read records appended (by us or other processes) since the
+        last refresh."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # partially written record, will be completed or
+                    # terminated by the next append
+                    break
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.status[record['key']] = record['status']
+                self.records[record['key']] = record
+
+    def __contains__(self, key):
+        return self.status.get(key) == 'done'
+
+    def __len__(self):
+        return len(self.status)
+
+    def keys_with(self, status):
+        return [key for key, s in self.status.items() if s == status]
+
+    def _write(self, data, truncate=False):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | (0 if truncate else os.O_APPEND), 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if truncate:
+                os.ftruncate(fd, 0)
+            else:
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b'\n':
+                    # a writer died in the middle of a record
+                    data = b'\n' + data
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def append(self, records):
+        data = b''.join(json.dumps(r).encode() + b'\n' for r in records)
+        self._write(data)
+        for record in records:
+            self.status[record['key']] = record['status']
+            self.records[record['key']] = record
+
+    def record(self, key, status='done', **fields):
+        record = dict(fields, key=key, status=status)
+        self.append([record])
+
+    def reset(self):
+        self._write(b'', truncate=True)
+        self.status = {}
+        self.records = {}
+        self.offset = 0
@@ -0,0 +1,126 @@
+"""
+Derived metrics over a ResultsTable.
+
+Each metric is declared once, with the columns it needs, as a NumPy
+expression over whole columns. DerivedMetrics computes a metric the first
+time it is asked for and keeps the array, so every plot that uses it just
+slices the same precomputed column.
+"""
+import numpy as np
+
+COND_PREDICTED = 'system.cpu.branchPred.condPredicted'
+COND_INCORRECT = 'system.cpu.branchPred.condIncorrect'
+
+# name -> (columns it needs, function(DerivedMetrics) -> ndarray)
+METRICS = {}
+
+def metric(name, needs=()):
+    def register(function):
+        METRICS[name] = (list(needs), function)
+        return function
+    return register
+
+@metric('cache_size_kb', ['CacheSize'])
+def _cache_size_kb(m):
+    return m['CacheSize'] / 1024
+
+@metric('matrix_label', ['M_I', 'M_J', 'M_K'])
+def _matrix_label(m):
+    # IxJ*JxK
+    i, j, k = (np.asarray(m[name]).astype(str) for name in ['M_I', 'M_J', 'M_K'])
+    label = np.char.add(np.char.add(np.char.add(i, 'x'), j), '*')
+    return np.char.add(np.char.add(np.char.add(label, j), 'x'), k)
+
+@metric('bp_predicted_per_incorrect', [COND_PREDICTED, COND_INCORRECT])
+def _bp_predicted_per_incorrect(m):
+    # what the branch predictor plots have always shown
+    return m[COND_PREDICTED] / m[COND_INCORRECT] * 100
+
+@metric('branch_miss_rate', [COND_PREDICTED, COND_INCORRECT])
+def _branch_miss_rate(m):
+    return m[COND_INCORRECT] / m[COND_PREDICTED] * 100
+
+@metric('branch_mpki', [COND_INCORRECT, 'sim_insts'])
+def _branch_mpki(m):
+    return m[COND_INCORRECT] / m['sim_insts'] * 1000
+
+@metric('page_hit_rate', ['system.mem_ctrls.pageHitRate'])
+def _page_hit_rate(m):
+    return np.asarray(m['system.mem_ctrls.pageHitRate'])
+
+@metric('ipc', ['system.cpu.ipc'])
+def _ipc(m):
+    return np.asarray(m['system.cpu.ipc'])
+
+@metric('cpi', ['system.cpu.ipc'])
+def _cpi(m):
+    return 1 / m['system.cpu.ipc']
+
+@metric('speedup', ['sim_ticks'])
+def _speedup(m):
+    # sim_ticks of the baseline run (baseline BP and cache size) with the
+    # same matrix and loop unrolling, over sim_ticks of each run
+    return m.baseline_of('sim_ticks') / m['sim_ticks']
+
+class DerivedMetrics(object):
+    def __init__(self, table, baseline, wide=None):
+        """baseline: {column: value} picking the baseline runs, e.g.
+        {'BP': 'TournamentBP', 'CacheSize': 8192}. wide: optional
+        results_store.WideTable for stats the table does not have."""
+        self.table = table
+        self.baseline = baseline
+        self.wide = wide
+        self.cache = {}
+
+    def _column(self, name):
+        if name in self.table or self.wide is None:
+            return self.table[name]
+        return self.wide[name]
+
+    def __getitem__(self, name):
+        if name in self.cache:
+            return self.cache[name]
+        if name not in METRICS:
+            return self._column(name)
+        needs, function = METRICS[name]
+        source = self.wide if self.wide is not None else self.table
+        missing = [column for column in needs if column not in source]
+        if missing:
+            raise KeyError('metric %s needs columns %s' % (name, ', '.join(missing)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.cache[name] = function(self)
+        return self.cache[name]
+
+    def __len__(self):
+        return len(self.table)
+
+    def mask(self, **conditions):
+        return self.table.mask(**conditions)
+
+    def labels(self, name):
+        return self.table.labels(name)
+
+    def baseline_of(self, name, group_by=('Benchmark', 'M_I', 'M_J', 'M_K', 'LOOP_UNROLLING')):
+        """
+        For every row, the value of column name in the baseline run of its
+        group (rows with equal group_by columns), NaN if the group has no
+        baseline run. With duplicate baseline runs the last one wins.
+        """
+        keys = np.stack([np.asarray(self.table[column], dtype=np.int64)
+                         for column in group_by], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        base = np.full(len(groups), np.nan)
+        rows = np.flatnonzero(self.table.mask(**self.baseline))
+        base[inverse[rows]] = np.asarray(self._column(name))[rows]
+        return base[inverse]
+
+def last_by(x, y):
+    """
+    Sorted unique values of x and, for each, the y of the last row that had
+    it (later runs of the same point replace earlier ones).
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    ux, first = np.unique(x[::-1], return_index=True)
+    return ux, y[::-1][first]
@@ -0,0 +1,276 @@
+"""
+Live progress of the simulations of a sweep.
+
+While it simulates, every child calls m5.simulate() in slices of about
+--status_interval seconds and after each one writes
+<directory>/.status/<run dir>.json with the simulated ticks and committed
+instructions so far and the host rates of the last slice. The process
+running the sweep keeps <directory>/.status/sweep-<host>-<pid>.json with
+the number of jobs done and, for every running job, its key, start and
+predicted wall time (see scheduler.py; none before metrics.jsonl has
+any history). The parent removes the status file of a
+child once it is reaped. Everything is plain files, so the monitor also
+works on the shared output directory of several queue workers.
+
+Usage:
+    python3 monitor.py output-directory [--watch SECONDS] [--stall SECONDS]
+
+prints the aggregate throughput of the sweep and, per running job, the
+progress, host rate and ETA. The ETA comes from the instructions earlier
+runs of the same program and arguments committed (metrics.jsonl, see
+timing.py), which do not depend on the cache or predictor, or else from
+the predicted wall time of the job. Jobs whose status was not updated for
+--stall seconds are marked "stalled", jobs whose process is gone "dead",
+and jobs running for more than twice their predicted wall time "overdue".
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+
+import timing
+
+STATUS_DIR = '.status'
+SWEEP_PREFIX = 'sweep-'
+
+def write_status(path, status):
+    # atomic for readers like utils.write_json_atomic, but without the
+    # fsync: status files are rewritten every few seconds and never needed
+    # after a crash
+    tmp_path = "%s.tmp.%d" % (path, os.getpid())
+    with open(tmp_path, 'w') as outfile:
+        json.dump(status, outfile)
+    os.replace(tmp_path, path)
+
+def status_dir(directory):
+    return os.path.join(directory, STATUS_DIR)
+
+def status_path(run_dir):
+    """Status file of the simulation writing to run_dir."""
+    parent, name = os.path.split(os.path.normpath(run_dir))
+    return os.path.join(status_dir(parent), name + '.json')
+
+def remove_status(run_dir):
+    try:
+        os.unlink(status_path(run_dir))
+    except FileNotFoundError:
+        pass
+
+class StatusWriter(object):
+    """
+    Child side: ticks and instructions of the running simulation, written
+    to its status file. chunk is the number of ticks to simulate before the
+    next update; it is adjusted after every slice so that updates come
+    about every interval seconds.
+    """
+    # first slice, about 3 s of a DerivO3CPU simulation
+    FIRST_CHUNK = 10 ** 8
+
+    def __init__(self, run_dir, options, cpus, interval, tick):
+        """Created after m5.instantiate(), when the simulation starts."""
+        self.path = status_path(run_dir)
+        self.cpus = cpus
+        self.interval = interval
+        self.chunk = self.FIRST_CHUNK
+        now = time.time()
+        insts = sum(cpu.totalInsts() for cpu in cpus)
+        self.status = {'pid': os.getpid(), 'host': socket.gethostname(),
+                       'dir': run_dir, 'cmd': options.cmd, 'options': options.options,
+                       'start': now, 'updated': now, 'tick': tick, 'insts': insts,
+                       'start_insts': insts,
+                       'host_inst_rate': 0.0, 'host_tick_rate': 0.0}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.last = (now, tick, insts)
+        write_status(self.path, self.status)
+
+    def update(self, tick):
+        now = time.time()
+        insts = sum(cpu.totalInsts() for cpu in self.cpus)
+        last_time, last_tick, last_insts = self.last
+        elapsed = max(now - last_time, 1e-6)
+        self.status['host_tick_rate'] = (tick - last_tick) / elapsed
+        self.status['host_inst_rate'] = (insts - last_insts) / elapsed
+        # next slice of about interval seconds, changing by 4x at most
+        self.chunk = int(min(max(self.chunk * self.interval / elapsed, self.chunk / 4),
+                             self.chunk * 4)) or 1
+        self.last = (now, tick, insts)
+        self.status.update(updated=now, tick=tick, insts=insts)
+        write_status(self.path, self.status)
+
+class SweepStatus(object):
+    """Parent side: jobs done and running, in a sweep-<worker>.json."""
+    def __init__(self, directory, total, done):
+        worker = "%s-%d" % (socket.gethostname(), os.getpid())
+        self.path = os.path.join(status_dir(directory), SWEEP_PREFIX + worker + '.json')
+        os.makedirs(status_dir(directory), exist_ok=True)
+        self.status = {'pid': os.getpid(), 'host': socket.gethostname(),
+                       'start': time.time(), 'total': total,
+                       'done_at_start': done, 'done': done, 'running': {}}
+
+    def update(self, done, running):
+        """running: the sims of gem5script.run_jobs, by pid."""
+        self.status['done'] = done
+        self.status['updated'] = time.time()
+        self.status['running'] = {
+            os.path.basename(sim['dir']): {'key': sim.get('UUID'), 'start': sim['start'],
+                                           'predicted_s': sim.get('predicted_s')}
+            for sim in running.values()}
+        write_status(self.path, self.status)
+
+    def close(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+def load_status(directory):
+    """(sweeps, jobs): the status files of the sweeps and of the running
+    simulations under directory."""
+    sweeps = []
+    jobs = []
+    path = status_dir(directory)
+    if not os.path.isdir(path):
+        return sweeps, jobs
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(path, name)) as f:
+                status = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue # removed or replaced meanwhile
+        if name.startswith(SWEEP_PREFIX):
+            # left behind by a sweep that was killed
+            if process_alive(status):
+                sweeps.append(status)
+        else:
+            status['name'] = name[:-len('.json')]
+            jobs.append(status)
+    return sweeps, jobs
+
+def expected_insts(records):
+    """{(program, arguments): instructions} of the runs that finished."""
+    insts = {}
+    for r in records:
+        if r.get('exit_status') or not r.get('sim_insts') or 'cmd' not in r:
+            continue
+        insts.setdefault((os.path.basename(r['cmd']), r.get('options')), []).append(r['sim_insts'])
+    return {program: statistics.median(values) for program, values in insts.items()}
+
+def process_alive(status):
+    if status.get('host') != socket.gethostname():
+        return True # can't tell
+    try:
+        os.kill(status['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def job_rows(jobs, sweeps, expected, stall, now):
+    """One dict per running simulation with its progress and ETA."""
+    planned = {}
+    for sweep in sweeps:
+        planned.update(sweep.get('running', {}))
+    rows = []
+    for job in jobs:
+        plan = planned.get(job['name'], {})
+        # since the fork if the sweep says when that was
+        elapsed = now - plan.get('start', job['start'])
+        row = {'name': plan.get('key') or job['name'], 'elapsed': elapsed,
+               'insts': job['insts'], 'rate': job['host_inst_rate'],
+               'progress': None, 'eta': None, 'flags': []}
+        total = expected.get((os.path.basename(job['cmd']), job.get('options')))
+        if total:
+            row['progress'] = min(job['insts'] / total, 1.0)
+            average = ((job['insts'] - job.get('start_insts', 0)) /
+                       max(job['updated'] - job['start'], 1e-6))
+            if average > 0:
+                row['eta'] = max(total - job['insts'], 0) / average
+        predicted = plan.get('predicted_s')
+        if row['eta'] is None and predicted:
+            row['eta'] = max(predicted - elapsed, 0.0)
+        if not process_alive(job):
+            row['flags'].append('dead')
+        elif now - job['updated'] > stall:
+            row['flags'].append('stalled')
+        if predicted and elapsed > 2 * predicted:
+            row['flags'].append('overdue')
+        rows.append(row)
+    rows.sort(key=lambda row: -(row['eta'] or 0))
+    return rows
+
+def sweep_summary(sweeps, jobs, now):
+    """Jobs done/total, completion rate (jobs/s) and ETA of all sweeps."""
+    done = sum(sweep['done'] for sweep in sweeps)
+    total = sum(sweep['total'] for sweep in sweeps)
+    finished = sum(sweep['done'] - sweep['done_at_start'] for sweep in sweeps)
+    elapsed = max([now - sweep['start'] for sweep in sweeps] or [0.0])
+    rate = finished / elapsed if elapsed > 0 else 0.0
+    alive = [job for job in jobs if process_alive(job)]
+    return {'done': done, 'total': total, 'running': len(alive), 'jobs_per_s': rate,
+            'eta': (total - done) / rate if rate > 0 else None,
+            'inst_rate': sum(job['host_inst_rate'] for job in alive),
+            'tick_rate': sum(job['host_tick_rate'] for job in alive)}
+
+def duration(seconds):
+    if seconds is None:
+        return '?'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '%dh%02dm' % (seconds // 3600, seconds % 3600 // 60)
+    return '%dm%02ds' % (seconds // 60, seconds % 60)
+
+def report(directory, sweeps, jobs, stall, out=sys.stdout):
+    now = time.time()
+    path = os.path.join(directory, timing.METRICS_FILE)
+    expected = expected_insts(timing.load_records(directory)) if os.path.exists(path) else {}
+    summary = sweep_summary(sweeps, jobs, now)
+    if sweeps:
+        out.write("%d of %d jobs done, %d running, %.2f jobs/min, sweep ETA %s\n"
+                  % (summary['done'], summary['total'], summary['running'],
+                     summary['jobs_per_s'] * 60, duration(summary['eta'])))
+    else:
+        out.write("no sweep running, %d simulations\n" % len(jobs))
+    out.write("simulating %.3g insts/s, %.3g ticks/s\n" % (summary['inst_rate'],
+                                                           summary['tick_rate']))
+    rows = job_rows(jobs, sweeps, expected, stall, now)
+    if rows:
+        out.write("\n%9s %10s %5s %10s %9s  %s\n" % ('elapsed', 'insts', 'done', 'insts/s',
+                                                     'ETA', 'job'))
+    for row in rows:
+        progress = '%4.0f%%' % (100 * row['progress']) if row['progress'] is not None else '    ?'
+        out.write("%9s %10.3g %5s %10.3g %9s  %s%s\n"
+                  % (duration(row['elapsed']), row['insts'], progress, row['rate'],
+                     duration(row['eta']), row['name'],
+                     '  [' + ', '.join(row['flags']) + ']' if row['flags'] else ''))
+    return summary, rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Live progress of a sweep")
+    parser.add_argument('directory', help="output directory of gem5script.py")
+    parser.add_argument('--watch', type=float, default=0,
+                        help="refresh every this many seconds until the sweep ends")
+    parser.add_argument('--stall', type=float, default=120,
+                        help="seconds without a status update after which a job is stalled")
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        sys.exit("no directory " + args.directory)
+    while True:
+        if args.watch:
+            # clear the terminal
+            sys.stdout.write('\033[H\033[2J')
+        sweeps, jobs = load_status(args.directory)
+        report(args.directory, sweeps, jobs, args.stall)
+        sys.stdout.flush()
+        # status files of processes that died are left behind
+        if not args.watch or not any(process_alive(status) for status in sweeps + jobs):
+            break
+        time.sleep(args.watch)
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,11 @@ import os.path
 import sys
 import datetime
 import json
+import copy
 
 import Options
+import result_cache
+from utils import eprint
 """Retrieve command-line options"""
 
 def create_tests():
@@ -19,6 +22,50 @@ def create_tests():
     return tests
 
 
+"""
+Exit if a sweep job sets a field that is not an option.
+"""
+def check_settings(options, settings):
+    for name in settings:
+        if not hasattr(options, name):
+            eprint("Unknown option in sweep: %s" % name)
+            sys.exit(1)
+
+
+"""
+Copy of options with the fields of a sweep job replaced.
+"""
+def apply_settings(options, settings):
+    check_settings(options, settings)
+    job_options = copy.copy(options)
+    for name, value in settings.items():
+        setattr(job_options, name, value)
+    return job_options
+
+
+# options queue workers take from the coordinator instead of their own
+# command line: everything that changes what gets simulated, and the time
+# limit of a simulation
+SHARED_OPTIONS = result_cache.CONFIG_FIELDS + ["job_timeout"]
+
+"""
+Values of the SHARED_OPTIONS of options, published with every job of a
+distributed sweep.
+"""
+def shared_options(options):
+    return {name: getattr(options, name) for name in SHARED_OPTIONS}
+
+
+"""
+--fast-forward N: run the first N instructions once on an AtomicSimpleCPU,
+checkpoint, and restore that in every simulation. The checkpoints go to
+<directory>/.checkpoints unless --checkpoint-dir is given.
+"""
+def set_checkpoint_dir(options):
+    if options.fast_forward and not options.checkpoint_dir:
+        options.checkpoint_dir = os.path.join(options.directory, ".checkpoints")
+
+
 def get_options(Options):
     parser = optparse.OptionParser()
     Options.addCommonOptions(parser)
@@ -31,6 +78,52 @@ def get_options(Options):
     parser.add_option("--branch_predictor", type="str", default="local")
     parser.add_option("--test", type="str", default=None)  # options single vs all
     parser.add_option("--restart_test", action="store_true")
+    # number of simulations of a --test sweep that run at the same time
+    parser.add_option("--jobs", type="int", default=1)
+    # directory of cached results, keyed on the effective configuration.
+    # Defaults to <directory>/.result_cache
+    parser.add_option("--result_cache", type="str", default=None)
+    parser.add_option("--no_result_cache", action="store_true")
+    # sampled simulation: detailed windows of --sample_window instructions
+    # (after --sample_warmup detailed instructions that are not measured)
+    # every --sample_interval functionally simulated instructions
+    parser.add_option("--sample_window", type="int", default=0)
+    parser.add_option("--sample_warmup", type="int", default=0)
+    parser.add_option("--sample_interval", type="int", default=0)
+    # dump and reset the stats every --stats_period ticks or
+    # --stats_period_insts instructions (one stats.txt block per period)
+    parser.add_option("--stats_period", type="int", default=0)
+    parser.add_option("--stats_period_insts", type="int", default=0)
+    # adaptive search: bisect the sweep along --search_axis until
+    # --search_metric is resolved to a relative tolerance of --search_tol
+    parser.add_option("--search", action="store_true")
+    parser.add_option("--search_axis", type="str", default="l1d_size")
+    parser.add_option("--search_metric", type="str", default="system.cpu.ipc")
+    parser.add_option("--search_tol", type="float", default=0.01)
+    # wall clock limit in seconds of every simulation of a --test sweep.
+    # Simulations over it are killed and queued again (with twice the
+    # limit) behind the other jobs, at most --job_requeues times
+    parser.add_option("--job_timeout", type="float", default=0)
+    parser.add_option("--job_requeues", type="int", default=1)
+    # a simulation of a --test sweep that fails is run again up to
+    # --retries times, --retry_backoff seconds after the first failure and
+    # twice as long after every other one. Jobs that still fail are
+    # quarantined: recorded in the progress journal and skipped when the
+    # sweep is resumed, unless --retry_quarantined is given
+    parser.add_option("--retries", type="int", default=1)
+    parser.add_option("--retry_backoff", type="float", default=10)
+    parser.add_option("--retry_quarantined", action="store_true")
+    # distributed sweeps: a coordinator (--test ... --queue_dir=Q) publishes
+    # the jobs to the shared directory Q, and any number of workers
+    # (--queue_dir=Q --queue_role=worker) on any host claim and run them.
+    # Workers that stop renewing a job for --lease_timeout seconds lose it
+    parser.add_option("--queue_dir", type="str", default=None)
+    parser.add_option("--queue_role", type="choice", choices=["coordinator", "worker"],
+                      default="coordinator")
+    parser.add_option("--lease_timeout", type="float", default=60)
+    # a running simulation reports its progress to <directory>/.status about
+    # every --status_interval seconds (see monitor.py); 0 disables it
+    parser.add_option("--status_interval", type="float", default=5)
 
     parser.set_defaults(
         # Default to writing to program.out in the current working directory
@@ -58,13 +151,60 @@ def get_options(Options):
             with open(options.test) as json_file:  
                 tests = json.load(json_file)
 
+    if options.no_result_cache:
+        options.result_cache = None
+    elif not options.result_cache:
+        options.result_cache = os.path.join(options.directory, ".result_cache")
+
+    set_checkpoint_dir(options)
+
+    if options.sample_window and options.sample_interval <= 0:
+        eprint("--sample_window needs a positive --sample_interval")
+        sys.exit(1)
+
+    if options.stats_period and options.stats_period_insts:
+        eprint("Use either --stats_period or --stats_period_insts")
+        sys.exit(1)
+    if options.sample_window and (options.stats_period or options.stats_period_insts):
+        eprint("Sampled simulation already dumps one block per window")
+        sys.exit(1)
+
+    if options.jobs < 1:
+        eprint("--jobs must be at least 1")
+        sys.exit(1)
+
+    if options.retries < 0 or options.retry_backoff < 0:
+        eprint("--retries and --retry_backoff can't be negative")
+        sys.exit(1)
+
+    if options.status_interval < 0:
+        eprint("--status_interval can't be negative")
+        sys.exit(1)
+
+    if options.job_timeout < 0 or options.job_requeues < 0:
+        eprint("--job_timeout and --job_requeues can't be negative")
+        sys.exit(1)
+    if options.queue_role == "worker" and not options.queue_dir:
+        eprint("--queue_role=worker needs --queue_dir")
+        sys.exit(1)
+    if options.queue_dir and options.queue_role == "coordinator" and not options.test:
+        eprint("The coordinator needs a --test sweep to publish")
+        sys.exit(1)
+    if options.lease_timeout <= 0:
+        eprint("--lease_timeout must be positive")
+        sys.exit(1)
+
+    if options.job_timeout and options.search:
+        # every point of a search wave is needed to plan the next one
+        eprint("--job_timeout can't be used with --search")
+        sys.exit(1)
+
     assert(not options.smt)
     assert(options.num_cpus == 1)
     #assert(not options.fastmem)
     assert(not options.standard_switch)
     assert(not options.repeat_switch)
     assert(not options.take_checkpoints)
-    assert(not options.fast_forward)
     assert(not options.maxinsts)
     assert(not options.l2cache)
 
@@ -0,0 +1,193 @@
+"""
+Pack the result directories of a sweep into one zip archive.
+
+The config.ini/config.json/config.dot of every run are almost the same
+(only a handful of fields change between points of a sweep), so the
+archive keeps them once under base/ and stores, per run, only the lines
+that differ from the base. stats.txt and the other files are stored
+deflated. Members of a zip can be read on their own, so any file of any
+run can be read back without unpacking the archive:
+
+    results = pack.open_archive('output_final.zip')
+    stats_reader.read_stats(results.lines(key, 'stats.txt'))
+
+Usage:
+    python3 pack.py output_final output_final.zip
+
+The archive is verified against the directories before the command
+returns. The analyser reads archives directly (--archive).
+"""
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sys
+import zipfile
+
+CONFIG_FILES = ['config.ini', 'config.json', 'config.dot']
+INDEX = 'index.json'
+DIFF_SUFFIX = '.diff'
+PACK_SUFFIX = '.zip'
+
+def results_hash(stats, config):
+    """Same content hash the analyser keeps in its manifest."""
+    digest = hashlib.sha1()
+    digest.update(stats)
+    digest.update(config)
+    return digest.hexdigest()
+
+def diff_lines(base, lines):
+    """[[i1, i2, new lines]]: replace base[i1:i2] by the new lines."""
+    matcher = difflib.SequenceMatcher(None, base, lines, autojunk=False)
+    return [[i1, i2, lines[j1:j2]]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+def patch_lines(base, ops):
+    lines = []
+    pos = 0
+    for i1, i2, new_lines in ops:
+        lines.extend(base[pos:i1])
+        lines.extend(new_lines)
+        pos = i2
+    lines.extend(base[pos:])
+    return lines
+
+def _split(data):
+    return data.decode('utf-8').splitlines(True)
+
+def pack(rootdir, archive_path):
+    """Pack every run directory of rootdir. Returns the index."""
+    folders = sorted(entry.name for entry in os.scandir(rootdir)
+                     if not entry.name.startswith('.') and entry.is_dir())
+    index = {'base': [], 'runs': {}}
+    base = {}
+    tmp_path = archive_path + '.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for key in folders:
+            folder = os.path.join(rootdir, key)
+            files = sorted(entry.name for entry in os.scandir(folder) if entry.is_file())
+            contents = {}
+            for name in files:
+                with open(os.path.join(folder, name), 'rb') as f:
+                    contents[name] = f.read()
+            for name in files:
+                data = contents[name]
+                if name not in CONFIG_FILES:
+                    archive.writestr('runs/%s/%s' % (key, name), data)
+                    continue
+                if name not in base:
+                    # the first run that has the file provides the base
+                    base[name] = _split(data)
+                    archive.writestr('base/' + name, data)
+                    index['base'].append(name)
+                ops = diff_lines(base[name], _split(data))
+                archive.writestr('runs/%s/%s%s' % (key, name, DIFF_SUFFIX), json.dumps(ops))
+            run = {'files': files}
+            if 'stats.txt' in contents and 'config.ini' in contents:
+                run['hash'] = results_hash(contents['stats.txt'], contents['config.ini'])
+            index['runs'][key] = run
+        archive.writestr(INDEX, json.dumps(index))
+    os.replace(tmp_path, archive_path)
+    return index
+
+class PackedResults(object):
+    """Random access to the files of the runs in a packed archive."""
+    def __init__(self, path):
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        self.index = json.loads(self.archive.read(INDEX))
+        self.base = {}
+
+    def keys(self):
+        return sorted(self.index['runs'])
+
+    def __contains__(self, key):
+        return key in self.index['runs']
+
+    def files(self, key):
+        return self.index['runs'][key]['files']
+
+    def run_hash(self, key):
+        return self.index['runs'][key].get('hash')
+
+    def _base(self, name):
+        if name not in self.base:
+            self.base[name] = _split(self.archive.read('base/' + name))
+        return self.base[name]
+
+    def lines(self, key, name):
+        """Lines of file name of run key, with their line ends."""
+        if name in CONFIG_FILES:
+            ops = json.loads(self.archive.read('runs/%s/%s%s' % (key, name, DIFF_SUFFIX)))
+            return patch_lines(self._base(name), ops)
+        return _split(self.archive.read('runs/%s/%s' % (key, name)))
+
+    def read(self, key, name):
+        """Contents of file name of run key, as bytes."""
+        if name in CONFIG_FILES:
+            return ''.join(self.lines(key, name)).encode('utf-8')
+        return self.archive.read('runs/%s/%s' % (key, name))
+
+# one open archive per path and process: the file offset of a ZipFile
+# opened before a fork would be shared with the children
+_archives = {}
+
+def open_archive(path):
+    if (path, os.getpid()) not in _archives:
+        _archives[(path, os.getpid())] = PackedResults(path)
+    return _archives[(path, os.getpid())]
+
+def run_file(folder, name):
+    """Path of file name of a run directory, or its lines if the run is
+    in an archive (archive.zip/key); stats_reader takes either."""
+    archive, key = split_path(folder)
+    if archive:
+        return open_archive(archive).lines(key, name)
+    return os.path.join(folder, name)
+
+def split_path(path):
+    """(archive, key) for a run path inside an archive (archive.zip/key),
+    (None, path) for a plain directory."""
+    archive, key = os.path.split(path)
+    if archive.endswith(PACK_SUFFIX) and os.path.isfile(archive):
+        return archive, key
+    return None, path
+
+def verify(rootdir, archive_path):
+    """Names of the files that do not read back identical."""
+    results = PackedResults(archive_path)
+    bad = []
+    for key in results.keys():
+        for name in results.files(key):
+            with open(os.path.join(rootdir, key, name), 'rb') as f:
+                if f.read() != results.read(key, name):
+                    bad.append(os.path.join(key, name))
+    return bad
+
+def tree_size(rootdir):
+    size = 0
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(rootdir):
+        for name in filenames:
+            size += os.path.getsize(os.path.join(dirpath, name))
+            count += 1
+    return size, count
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the result directories of a sweep")
+    parser.add_argument('rootdir', help="directory with one directory per run")
+    parser.add_argument('archive', help="archive to write (.zip)")
+    args = parser.parse_args()
+    if not args.archive.endswith(PACK_SUFFIX):
+        sys.exit("the archive name must end in " + PACK_SUFFIX)
+    index = pack(args.rootdir, args.archive)
+    bad = verify(args.rootdir, args.archive)
+    if bad:
+        sys.exit("%d files differ after packing, e.g. %s" % (len(bad), bad[0]))
+    size, count = tree_size(args.rootdir)
+    print("%d runs, %d files, %.1f MB -> %.1f MB" % (len(index['runs']), count, size / 1e6,
+                                                     os.path.getsize(args.archive) / 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Batch figure rendering for gem5_analyser.
+
+A figure is described by a PlotSpec (what to plot, which rows, scale, output
+file, labels). render_all draws a list of specs on the Agg backend. With
+more than one worker, the specs are split over worker processes. Each
+process loads the results store once (memory-mapped) and reuses a single
+Figure, clearing it between plots, so memory stays flat no matter how many
+figures are drawn.
+"""
+import collections
+import multiprocessing
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+
+import metrics
+import results_store
+
+# kind: 'line' (one series of y against x) or 'bars' (one bar series per
+#       branch predictor)
+# x, y: column or metric names
+# filter: {column: value} selecting the rows
+# scale: y axis scale, 'linear' or 'log'
+# legend: legend location for 'bars'
+PlotSpec = collections.namedtuple('PlotSpec', [
+    'kind', 'x', 'y', 'filter', 'scale', 'file', 'title', 'xlabel', 'ylabel', 'legend'])
+PlotSpec.__new__.__defaults__ = ('linear', None, '', '', '', 'best')
+
+# predictor, color, in the order the bars are drawn
+BAR_SERIES = [('TournamentBP', 'b'), ('BiModeBP', 'g'), ('LocalBP', 'r')]
+BAR_WIDTH = 0.3
+BAR_OPACITY = 0.8
+
+def bp_series(data, rows, x, y, label_bp):
+    """
+    y against sorted x for every branch predictor over rows (the last row
+    wins if a point repeats). The x labels are the ones of label_bp.
+    """
+    series = {}
+    labels = []
+    for bp, color in BAR_SERIES:
+        selected = rows & data.mask(BP=bp)
+        bp_labels, series[bp] = metrics.last_by(data[x][selected], data[y][selected])
+        if bp == label_bp:
+            labels = bp_labels
+    return labels, series
+
+def draw(fig, data, spec, label_bp):
+    ax = fig.add_subplot(1, 1, 1)
+    rows = data.mask(**spec.filter)
+    if spec.kind == 'line':
+        x, y = metrics.last_by(data[spec.x][rows], data[spec.y][rows])
+        ax.plot(x, y)
+        ax.set(xlabel=spec.xlabel, ylabel=spec.ylabel, title=spec.title)
+        ax.grid()
+        if spec.scale != 'linear':
+            ax.set_yscale(spec.scale)
+    elif spec.kind == 'bars':
+        labels, series = bp_series(data, rows, spec.x, spec.y, label_bp)
+        index = np.arange(len(labels))
+        for i, (bp, color) in enumerate(BAR_SERIES):
+            ax.bar(index + BAR_WIDTH * i, series[bp], BAR_WIDTH,
+                   alpha=BAR_OPACITY, color=color, label=bp)
+        if spec.scale != 'linear':
+            ax.set_yscale(spec.scale)
+        ax.set_xlabel(spec.xlabel)
+        ax.set_ylabel(spec.ylabel)
+        ax.set_title(spec.title)
+        ax.set_xticks(index + BAR_WIDTH)
+        ax.set_xticklabels(labels)
+        ax.legend(loc=spec.legend)
+        fig.tight_layout()
+    else:
+        raise ValueError('unknown plot kind %s' % spec.kind)
+
+class Renderer(object):
+    """Draws specs one after another on the same Figure."""
+    def __init__(self, storedir, baseline):
+        table = results_store.ResultsTable.load(storedir)
+        self.data = metrics.DerivedMetrics(table, baseline)
+        self.label_bp = baseline.get('BP')
+        self.fig = Figure()
+        FigureCanvasAgg(self.fig)
+
+    def render(self, spec):
+        self.fig.clf()
+        directory = os.path.dirname(spec.file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        draw(self.fig, self.data, spec, self.label_bp)
+        self.fig.savefig(spec.file)
+        return spec.file
+
+    def close(self):
+        self.fig.clf()
+        self.fig = None
+
+_renderer = None
+
+def _init_worker(storedir, baseline):
+    global _renderer
+    _renderer = Renderer(storedir, baseline)
+
+def _render(spec):
+    return _renderer.render(spec)
+
+def render_all(specs, storedir, baseline, workers=None):
+    """Render every spec; returns the files written, in order."""
+    workers = min(workers or os.cpu_count() or 1, len(specs))
+    if workers <= 1:
+        renderer = Renderer(storedir, baseline)
+        try:
+            return [renderer.render(spec) for spec in specs]
+        finally:
+            renderer.close()
+    chunksize = max(1, len(specs) // (workers * 4))
+    with multiprocessing.Pool(workers, _init_worker, (storedir, baseline)) as pool:
+        return pool.map(_render, specs, chunksize)
@@ -0,0 +1,85 @@
+"""
+Content-addressed cache of finished simulations.
+
+A result is keyed on a hash of every option that changes what gets
+simulated plus a hash of the executable itself, so two runs share an
+entry only if gem5 would produce the same stats for both. Entries live in
+a directory (one file per key holding the path of the result directory)
+that is independent of the --test progress, so --restart_test keeps them.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from utils import write_json_atomic
+
+# Options consumed by create_cpu, create_process and run_system_with_cpu
+CONFIG_FIELDS = [
+    'cmd', 'options', 'input',
+    'l1i_size', 'l1i_assoc', 'l1d_size', 'l1d_assoc', 'branch_predictor',
+    'cacheline_size', 'cpu_clock', 'sys_clock', 'sys_voltage',
+    'mem_type', 'mem_size', 'mem_channels', 'mem_ranks',
+    'abs_max_tick', 'rel_max_tick', 'maxtime', 'fast_forward',
+    'sample_window', 'sample_warmup', 'sample_interval',
+    'stats_period', 'stats_period_insts',
+]
+
+# Files of a result directory that are reused on a cache hit
+RESULT_FILES = ['stats.txt', 'config.ini', 'config.json', 'config.dot',
+                'program.out', 'program.err',
+                'sampling.json', 'sample_stats.json']
+
+_file_hashes = {}
+
+def file_hash(path):
+    """sha256 of a file's contents, memoized on (path, mtime, size)."""
+    st = os.stat(path)
+    memo_key = (path, st.st_mtime_ns, st.st_size)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+def effective_config(options):
+    """The part of options that determines the simulation result."""
+    config = {name: getattr(options, name, None) for name in CONFIG_FIELDS}
+    config['executable'] = file_hash(os.path.realpath(options.cmd))
+    return config
+
+def config_key(options):
+    blob = json.dumps(effective_config(options), sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def lookup(cache_dir, key):
+    """Result directory cached for key, or None."""
+    entry = os.path.join(cache_dir, key)
+    if not os.path.exists(entry):
+        return None
+    with open(entry) as f:
+        the_dir = json.load(f)['dir']
+    # the directory may have been removed since it was cached
+    if not os.path.exists(os.path.join(the_dir, 'stats.txt')):
+        return None
+    return the_dir
+
+def store(cache_dir, key, the_dir):
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    write_json_atomic(os.path.join(cache_dir, key),
+                      {'dir': os.path.realpath(the_dir)})
+
+def restore(src_dir, dst_dir):
+    """Hard-link (or copy, across filesystems) a cached result into dst_dir."""
+    for name in RESULT_FILES:
+        src = os.path.join(src_dir, name)
+        dst = os.path.join(dst_dir, name)
+        if not os.path.exists(src) or os.path.exists(dst):
+            continue
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
@@ -0,0 +1,269 @@
+"""
+Columnar, memory-mappable store for the analyser's dataset.
+
+Every column is a NumPy array saved as its own .npy file, so reloading a
+store is just np.load(mmap_mode='r') per column, with no parsing. Text
+columns with few distinct values (the benchmark and the branch predictor)
+are stored as integer codes plus a list of labels. schema.json records the
+columns, their file names and the category labels.
+
+WideTable gives access to every stat of stats.txt, not only the ones the
+store was built with: a column is read from the runs the first time it
+is used and cached under wide/ in the store.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+
+import numpy as np
+
+import pack
+import stats_reader
+from utils import write_json_atomic
+
+SCHEMA_FILE = 'schema.json'
+# which result directories the store was built from, see gem5_analyser.ingest
+MANIFEST_FILE = 'manifest.json'
+
+# materialized columns of WideTable, inside the store
+WIDE_DIR = 'wide'
+WIDE_INDEX = 'index.json'
+
+# Columns that describe the configuration of a run; every other column is
+# a stat from stats.txt
+KEY_COLUMNS = ['folder', 'Benchmark', 'BP', 'LOOP_UNROLLING', 'CacheSize', 'M_I', 'M_J', 'M_K']
+CATEGORY_COLUMNS = ['Benchmark', 'BP']
+
+def _file_name(name):
+    # stat names may contain '::', keep file names portable
+    return name.replace('::', '__').replace('/', '_') + '.npy'
+
+class ResultsTable(object):
+    def __init__(self, columns, categories=None):
+        self.columns = columns
+        self.categories = categories or {}
+
+    @classmethod
+    def from_records(cls, records, stat_names):
+        """Build a table from getTest dicts (one per run)."""
+        columns = {}
+        categories = {}
+        columns['folder'] = np.array([r['folder'] for r in records], dtype=str)
+        for name in CATEGORY_COLUMNS:
+            labels = sorted(set(r[name] for r in records))
+            code = {label: i for i, label in enumerate(labels)}
+            columns[name] = np.array([code[r[name]] for r in records], dtype=np.int16)
+            categories[name] = labels
+        columns['LOOP_UNROLLING'] = np.array([r['LOOP_UNROLLING'] for r in records], dtype=bool)
+        for name in ['CacheSize', 'M_I', 'M_J', 'M_K']:
+            columns[name] = np.array([int(r[name]) for r in records], dtype=np.int64)
+        for name in stat_names:
+            columns[name] = np.array([r['stats'].get(name, np.nan) for r in records],
+                                     dtype=np.float64)
+        return cls(columns, categories)
+
+    @classmethod
+    def concat(cls, tables):
+        """Stack tables with the same columns, merging category labels."""
+        categories = {}
+        for name in tables[0].categories:
+            categories[name] = sorted(set(label for t in tables for label in t.categories[name]))
+        columns = {}
+        for name in tables[0].columns:
+            parts = []
+            for t in tables:
+                column = np.asarray(t.columns[name])
+                if name in categories:
+                    # re-code into the merged label list
+                    remap = np.array([categories[name].index(label)
+                                      for label in t.categories[name]], dtype=column.dtype)
+                    column = remap[column] if len(remap) else column
+                parts.append(column)
+            columns[name] = np.concatenate(parts)
+        return cls(columns, categories)
+
+    def __len__(self):
+        return len(self.columns['folder'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def stat_names(self):
+        return [name for name in self.columns if name not in KEY_COLUMNS]
+
+    def labels(self, name):
+        """Category column decoded back to its labels."""
+        return np.asarray(self.categories[name])[self.columns[name]]
+
+    def code(self, name, label):
+        """Integer code of a category label, -1 if it never occurs."""
+        labels = self.categories[name]
+        return labels.index(label) if label in labels else -1
+
+    def mask(self, **conditions):
+        """
+        Boolean mask of the rows where every column equals the given value,
+        e.g. table.mask(BP='TournamentBP', M_I=128, M_J=50, M_K=20).
+        """
+        rows = np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            if name in self.categories:
+                value = self.code(name, value)
+            rows &= self.columns[name] == value
+        return rows
+
+    def select(self, rows):
+        """New table with only the rows picked by a mask or index array."""
+        return ResultsTable({name: column[rows] for name, column in self.columns.items()},
+                            self.categories)
+
+    def save(self, path, manifest=None):
+        """Write the table (and its manifest) to directory path, replacing
+        it atomically."""
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        schema = {'columns': {}, 'categories': self.categories}
+        for name, column in self.columns.items():
+            schema['columns'][name] = _file_name(name)
+            np.save(os.path.join(tmp_path, _file_name(name)), np.asarray(column))
+        with open(os.path.join(tmp_path, SCHEMA_FILE), 'w') as f:
+            json.dump(schema, f)
+        if manifest is not None:
+            save_manifest(tmp_path, manifest)
+        old_path = path + '.old'
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        columns = {name: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode)
+                   for name, file_name in schema['columns'].items()}
+        return cls(columns, schema['categories'])
+
+def exists(path):
+    return os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+def load_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    write_json_atomic(os.path.join(path, MANIFEST_FILE), manifest)
+
+def run_hashes(path, table):
+    """Content hash (from the manifest of the store at path) of the run of
+    every row of table, '' where it is not known."""
+    manifest = load_manifest(path).get('folders', {})
+    return np.array([manifest.get(folder, {}).get('hash') or '' for folder in table['folder']],
+                    dtype=object)
+
+def _read_run(task):
+    folder, names = task
+    stats = stats_reader.read_stats(pack.run_file(folder, 'stats.txt'), names)
+    return [stats.get(name, np.nan) for name in names]
+
+class WideTable(object):
+    """
+    Every scalar stat of stats.txt (first block) as a column aligned with
+    the rows of a stored ResultsTable. Columns are read from the runs only
+    when first asked for, in one pass over the runs for all the columns
+    asked for together, and saved as .npy under <store>/wide. The cache
+    is dropped when the runs of the store change (their content hashes in
+    the manifest).
+    """
+    def __init__(self, path, table=None, workers=None):
+        self.path = path
+        self.table = table if table is not None else ResultsTable.load(path)
+        self.workers = workers
+        self.dir = os.path.join(path, WIDE_DIR)
+        self.columns = {}
+        manifest = load_manifest(path).get('folders', {})
+        digest = hashlib.sha1()
+        for folder in self.table['folder']:
+            digest.update(json.dumps([folder, manifest.get(folder, {}).get('hash')]).encode())
+        self.fingerprint = digest.hexdigest()
+        self.index = {'fingerprint': self.fingerprint, 'columns': {}, 'names': None}
+        index_path = os.path.join(self.dir, WIDE_INDEX)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get('fingerprint') == self.fingerprint:
+                self.index = index
+            else:
+                shutil.rmtree(self.dir)
+
+    def _save_index(self):
+        os.makedirs(self.dir, exist_ok=True)
+        write_json_atomic(os.path.join(self.dir, WIDE_INDEX), self.index)
+
+    def names(self):
+        """Names of the scalar stats (vector entries as key::sub), taken
+        from the first run; gem5 writes the same set for every run of a
+        configuration."""
+        if self.index['names'] is None:
+            names = []
+            if len(self.table):
+                stats = stats_reader.read_stats(pack.run_file(self.table['folder'][0], 'stats.txt'))
+                for key, value in stats.items():
+                    if isinstance(value, dict):
+                        names += [key + '::' + sub for sub in value]
+                    else:
+                        names.append(key)
+            self.index['names'] = names
+            self._save_index()
+        return self.index['names']
+
+    def __contains__(self, name):
+        return name in self.table or name in self.index['columns'] or name in self.names()
+
+    def __getitem__(self, name):
+        if name in self.table:
+            return self.table[name]
+        if name not in self:
+            raise KeyError('no stat %s in %s' % (name, self.table['folder'][0]))
+        return self.materialize([name])[name]
+
+    def materialize(self, names):
+        """{name: column} for names, reading the missing ones from the runs."""
+        missing = [name for name in names
+                   if name not in self.columns and name not in self.index['columns']]
+        if missing:
+            self._read(missing)
+        for name in names:
+            if name not in self.columns:
+                self.columns[name] = np.load(os.path.join(self.dir, self.index['columns'][name]),
+                                             mmap_mode='r')
+        return {name: self.columns[name] for name in names}
+
+    def _read(self, names):
+        tasks = [(folder, names) for folder in self.table['folder']]
+        workers = self.workers or os.cpu_count() or 1
+        if workers == 1 or len(tasks) < 2:
+            rows = [_read_run(task) for task in tasks]
+        else:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            with multiprocessing.Pool(workers) as pool:
+                rows = pool.map(_read_run, tasks, chunksize)
+        values = np.array(rows, dtype=np.float64).reshape(len(tasks), len(names))
+        os.makedirs(self.dir, exist_ok=True)
+        for i, name in enumerate(names):
+            file_name = _file_name(name)
+            np.save(os.path.join(self.dir, file_name), values[:, i])
+            self.index['columns'][name] = file_name
+            self.columns[name] = values[:, i]
+        self._save_index()
@@ -0,0 +1,120 @@
+"""
+Summaries of sampled simulations.
+
+In sampled mode (--sample_window) the detailed CPU only runs short
+windows between stretches of functional execution, and stats.txt holds
+one Begin/End block per window. This module turns those windows into
+whole-program estimates with 95% confidence intervals and writes them to
+sample_stats.json next to stats.txt.
+"""
+import json
+import math
+import os
+
+import stats_reader
+from utils import write_json_atomic
+
+# Written by the simulation itself: sampling parameters and instruction counts
+SAMPLING_FILE = 'sampling.json'
+SUMMARY_FILE = 'sample_stats.json'
+
+WINDOW_STATS = ['system.cpu.ipc',
+                'system.cpu.committedInsts',
+                'system.cpu.numCycles',
+                'system.cpu.branchPred.condPredicted',
+                'system.cpu.branchPred.condIncorrect',
+                'system.cpu.dcache.overall_miss_rate::total',
+                'system.cpu.icache.overall_miss_rate::total']
+
+# two-sided 95% Student t critical values for 1..30 degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+def read_windows(stats_path, keys=WINDOW_STATS):
+    """One dict of the requested stats per Begin/End block of stats.txt."""
+    return list(stats_reader.iter_blocks(stats_path, keys))
+
+def confidence_interval(values):
+    """(mean, half width of the 95% confidence interval) of values."""
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, float('nan')
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    t = T_95[n - 2] if n - 1 <= len(T_95) else 1.96
+    return mean, t * math.sqrt(variance / n)
+
+def ratio_interval(numerators, denominators):
+    """(sum(numerators) / sum(denominators), half width of its 95%
+    confidence interval), by the usual first order approximation of the
+    variance of a ratio estimator."""
+    n = len(numerators)
+    ratio = sum(numerators) / sum(denominators)
+    if n < 2:
+        return ratio, float('nan')
+    mean_denominator = sum(denominators) / n
+    residuals = [x - ratio * y for x, y in zip(numerators, denominators)]
+    variance = sum(r ** 2 for r in residuals) / (n - 1) / n / mean_denominator ** 2
+    t = T_95[n - 2] if n - 1 <= len(T_95) else 1.96
+    return ratio, t * math.sqrt(variance)
+
+def window_metrics(window):
+    metrics = {'ipc': window.get('system.cpu.ipc')}
+    predicted = window.get('system.cpu.branchPred.condPredicted')
+    incorrect = window.get('system.cpu.branchPred.condIncorrect')
+    if predicted:
+        metrics['branch_mispredict_rate'] = incorrect / predicted
+    insts = window.get('system.cpu.committedInsts')
+    if insts and predicted:
+        metrics['branches_per_inst'] = predicted / insts
+    metrics['dcache_miss_rate'] = window.get('system.cpu.dcache.overall_miss_rate::total')
+    metrics['icache_miss_rate'] = window.get('system.cpu.icache.overall_miss_rate::total')
+    return {name: value for name, value in metrics.items()
+            if value is not None and not math.isnan(value)}
+
+def summarize(the_dir):
+    """Per-metric mean and confidence interval over all windows, plus
+    whole-program estimates extrapolated from them. Without any window
+    (the program ended before the first one) or without SAMPLING_FILE
+    there are no estimates."""
+    raw_windows = read_windows(os.path.join(the_dir, 'stats.txt'))
+    windows = [window_metrics(w) for w in raw_windows]
+    sampling_path = os.path.join(the_dir, SAMPLING_FILE)
+    sampling = None
+    if os.path.exists(sampling_path):
+        with open(sampling_path) as f:
+            sampling = json.load(f)
+
+    summary = {'windows': len(windows), 'sampling': sampling, 'metrics': {}}
+    if not windows or sampling is None:
+        return summary
+    names = sorted(set(name for w in windows for name in w))
+    for name in names:
+        values = [w[name] for w in windows if name in w]
+        mean, half_width = confidence_interval(values)
+        summary['metrics'][name] = {'mean': mean, 'ci95': half_width, 'n': len(values)}
+
+    # whole program estimates, scaling the per-instruction means by the
+    # total number of instructions executed (detailed + functional)
+    total_insts = sampling['total_insts']
+    metrics = summary['metrics']
+    estimates = {'insts': total_insts}
+    # cycles per instruction of all windows together, not one over the
+    # mean IPC, which overestimates the IPC of the program
+    counted = [w for w in raw_windows
+               if w.get('system.cpu.committedInsts') and w.get('system.cpu.numCycles')]
+    if counted:
+        cpi, cpi_ci95 = ratio_interval([w['system.cpu.numCycles'] for w in counted],
+                                       [w['system.cpu.committedInsts'] for w in counted])
+        estimates['cycles'] = total_insts * cpi
+        estimates['cycles_ci95'] = total_insts * cpi_ci95
+    if 'branch_mispredict_rate' in metrics and 'branches_per_inst' in metrics:
+        branches = total_insts * metrics['branches_per_inst']['mean']
+        estimates['cond_branches'] = branches
+        estimates['cond_mispredicts'] = branches * metrics['branch_mispredict_rate']['mean']
+    summary['estimates'] = estimates
+    return summary
+
+def write_summary(the_dir):
+    write_json_atomic(os.path.join(the_dir, SUMMARY_FILE), summarize(the_dir))
@@ -0,0 +1,108 @@
+"""
+Longest-first scheduling of the jobs of a sweep.
+
+The cost of a point varies by orders of magnitude (M:100,100,100 on an 8kB
+cache against M:50,100,20), so running them in nested-loop order can leave
+one huge simulation running alone at the end of a parallel sweep. The
+queue hands out the jobs with the largest predicted wall time first, which
+keeps the makespan close to the longest single job. run_jobs only queues a
+window of the sweep at a time and tops it up as jobs start, so the order
+is longest-first within that window.
+
+The prediction uses <directory>/metrics.jsonl (see timing.py): a job that
+already ran to completion costs what it took last time; otherwise the amount of work
+(the product of the numeric arguments of the program, I*J*K for
+blocked-matmul) is multiplied by the seconds per unit of work measured for
+the same program and L1D size, the same program, or any program, in that
+order. Without history the work alone orders the jobs.
+
+Jobs that hit the wall time limit are pushed back with a lower priority,
+so they only run again after every job that has not timed out yet. Jobs
+the sweep lists as deferred run after all the others.
+"""
+import heapq
+import os
+import re
+import statistics
+
+import timing
+
+def work(arguments):
+    """Product of the integers in the program arguments (at least 1)."""
+    product = 1
+    for number in re.findall(r'\d+', arguments or ''):
+        product *= max(int(number), 1)
+    return product
+
+class CostModel(object):
+    def __init__(self, records=()):
+        self.by_key = {}
+        rates = {}
+        for r in records:
+            # failed or killed runs say nothing about how long a job takes
+            if r.get('exit_status') or r.get('timed_out'):
+                continue
+            if r.get('key'):
+                self.by_key[r['key']] = r['wall_s']
+            if 'cmd' not in r:
+                continue
+            rate = r['wall_s'] / work(r.get('options'))
+            cmd = os.path.basename(r['cmd'])
+            l1d_size = r.get('settings', {}).get('l1d_size')
+            for group in [(cmd, l1d_size), (cmd,), ()]:
+                rates.setdefault(group, []).append(rate)
+        self.rates = {group: statistics.median(values) for group, values in rates.items()}
+
+    @classmethod
+    def from_directory(cls, directory):
+        if not os.path.exists(os.path.join(directory, timing.METRICS_FILE)):
+            return cls()
+        return cls(timing.load_records(directory))
+
+    def predict(self, key, options, settings=None):
+        """(cost, seconds) of the job key run with options, with the
+        fields in settings replaced. cost is the predicted wall time if
+        seconds is true; without any history it is only the amount of
+        work, good for ordering jobs but not for ETAs."""
+        if key in self.by_key:
+            return self.by_key[key], True
+        settings = settings or {}
+        value = lambda name: settings.get(name, getattr(options, name))
+        cmd = os.path.basename(value('cmd'))
+        for group in [(cmd, value('l1d_size')), (cmd,), ()]:
+            if group in self.rates:
+                return self.rates[group] * work(value('options')), True
+        return work(value('options')), False
+
+class JobQueue(object):
+    """
+    Priority queue of the jobs of a sweep. Deferred jobs come out last;
+    otherwise jobs come out by number of timeouts first (fewest first) and
+    by predicted cost second (largest first); ties keep the order of the
+    sweep.
+
+    Only the jobs are queued: the options of a job are made with
+    job_options(options, job.settings) when it comes out, so that a sweep
+    of a million points doesn't hold a copy of the options for each.
+    """
+    def __init__(self, model, options, job_options):
+        self.model = model
+        self.options = options
+        self.job_options = job_options
+        self.heap = []
+        self.count = 0
+
+    def push(self, job, timeouts=0, deferred=False):
+        cost, seconds = self.model.predict(job.key, self.options, job.settings)
+        heapq.heappush(self.heap, (deferred, timeouts, -cost, self.count, job, seconds))
+        self.count += 1
+
+    def pop(self):
+        """(job, its options, timeouts so far, deferred, predicted wall
+        time in seconds or None if there is no history to predict it)"""
+        deferred, timeouts, cost, count, job, seconds = heapq.heappop(self.heap)
+        return (job, self.job_options(self.options, job.settings), timeouts, deferred,
+                -cost if seconds else None)
+
+    def __len__(self):
+        return len(self.heap)
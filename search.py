@@ -0,0 +1,141 @@
+"""
+Adaptive search along one monotone sweep axis (--search).
+
+Instead of simulating every value of the axis (e.g. l1d_size), the jobs
+that only differ in that axis form a group and are bisected. Both ends
+are simulated first. An interval whose end points already agree on the
+target metric within a relative tolerance is taken as flat, and its
+interior is interpolated instead of simulated. Otherwise its midpoint is
+simulated and both halves are checked again. The midpoints of every group
+are simulated together, one wave at a time, so the parallel executor stays
+busy.
+"""
+import collections
+import math
+
+import stats_reader
+from utils import eprint, size_bytes
+
+def _close(a, b, tolerance):
+    return abs(a - b) <= tolerance * max(abs(a), abs(b), 1e-12)
+
+class AxisBisection(object):
+    """Bisection over the values of one axis for one group of jobs."""
+    def __init__(self, jobs, tolerance):
+        self.jobs = jobs
+        self.tolerance = tolerance
+        self.values = {}
+        last = len(jobs) - 1
+        self.intervals = [(0, last)] if last > 0 else []
+        self.pending = sorted(set([0, last]))
+
+    def next_jobs(self):
+        """Jobs to simulate in the next wave."""
+        return [self.jobs[i] for i in self.pending]
+
+    def update(self, results):
+        """Take the metric of the last wave ({job key: value}) and plan the
+        next one."""
+        for i in self.pending:
+            self.values[i] = results[self.jobs[i].key]
+        self.pending = []
+        intervals = []
+        for a, b in self.intervals:
+            if b - a <= 1 or _close(self.values[a], self.values[b], self.tolerance):
+                continue
+            middle = (a + b) // 2
+            self.pending.append(middle)
+            intervals += [(a, middle), (middle, b)]
+        self.intervals = intervals
+
+    def done(self):
+        return not self.pending
+
+    def estimates(self):
+        """Metric for every job: simulated where known, linearly
+        interpolated between the closest simulated neighbours otherwise."""
+        known = sorted(self.values)
+        estimates = []
+        for i in range(len(self.jobs)):
+            if i in self.values:
+                estimates.append(self.values[i])
+                continue
+            a = max(k for k in known if k < i)
+            b = min(k for k in known if k > i)
+            fraction = (i - a) / (b - a)
+            estimates.append(self.values[a] + fraction * (self.values[b] - self.values[a]))
+        return estimates
+
+def axis_value(value):
+    """Number to order the values of an axis by: sizes such as '32kB' in
+    bytes, other numbers as they are. None if value is neither."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return size_bytes(value)
+    except ValueError:
+        return None
+
+def group_jobs(jobs, axis):
+    """
+    Group jobs that are equal except for axis, each group sorted by the
+    value of the axis. An axis that is not numeric keeps the order of the
+    sweep.
+    """
+    groups = collections.OrderedDict()
+    for job in jobs:
+        rest = tuple(sorted((name, str(value)) for name, value in job.settings.items()
+                            if name != axis))
+        groups.setdefault(rest, []).append(job)
+    groups = list(groups.values())
+    values = [axis_value(job.settings.get(axis)) for group in groups for job in group]
+    if None in values:
+        eprint("Search axis %s is not numeric, bisecting in the order of the sweep" % axis)
+        return groups
+    return [sorted(group, key=lambda job: axis_value(job.settings.get(axis)))
+            for group in groups]
+
+def read_metric(the_dir, metric):
+    # the whole run, also with --stats_period
+    stats = stats_reader.read_run_stats(the_dir + "/stats.txt", [metric])
+    return float(stats[metric])
+
+def run_search(jobs, axis, metric, tolerance, run_wave):
+    """
+    Bisect every group of jobs along axis. run_wave(jobs) must simulate the
+    given jobs and return {job key: result directory}, without the jobs
+    that failed. Returns one summary
+    dict per group; the metric of a point that failed, or that is
+    interpolated from one, is None (NaN is not valid JSON).
+    """
+    searches = [AxisBisection(group, tolerance) for group in group_jobs(jobs, axis)]
+    wave = 0
+    while True:
+        to_run = [job for search in searches if not search.done() for job in search.next_jobs()]
+        if not to_run:
+            break
+        wave += 1
+        print("######### SEARCH WAVE ", wave, ": ", len(to_run), " simulations ###############")
+        dirs = run_wave(to_run)
+        # a point that failed has no directory; NaN never agrees with its
+        # neighbours, so the intervals around it are bisected further
+        results = {job.key: read_metric(dirs[job.key], metric) if job.key in dirs
+                   else float("nan") for job in to_run}
+        for search in searches:
+            if not search.done():
+                search.update(results)
+
+    summary = []
+    for search in searches:
+        estimates = search.estimates()
+        summary.append({
+            "points": [{"key": job.key,
+                        axis: job.settings.get(axis),
+                        metric: None if math.isnan(estimate) else estimate,
+                        "simulated": i in search.values}
+                       for i, (job, estimate) in enumerate(zip(search.jobs, estimates))],
+            "simulated": len(search.values),
+            "total": len(search.jobs)})
+    return summary
@@ -0,0 +1,200 @@
+"""
+Streaming reader for gem5's stats.txt and config.ini.
+
+Only the requested stats are converted, and reading stops as soon as all of
+them have been seen, so pulling a handful of keys out of a ~900 line
+stats.txt usually touches only its first part. Files with several
+Begin/End blocks (periodic or per-window m5.stats.dump) can be read block
+by block.
+
+Values come back typed: int or float for scalars, and a dict of
+sub-name -> value for vector and histogram stats (every line that looks
+like ``key::something``). to_arrays turns blocks into NumPy arrays.
+
+The reader itself only needs the standard library so it can also be used
+from gem5script.py under gem5's interpreter.
+"""
+
+BEGIN_MARK = '---------- Begin Simulation Statistics'
+END_MARK = '---------- End Simulation Statistics'
+
+# ratios of two counters, recomputed for a whole periodic run from the
+# counters summed over its periods
+RATIOS = {'system.cpu.ipc': ('system.cpu.committedInsts', 'system.cpu.numCycles'),
+          'system.cpu.cpi': ('system.cpu.numCycles', 'system.cpu.committedInsts')}
+# non-integer stats that add up over periods
+ADDITIVE = ['sim_seconds', 'host_seconds']
+
+class FieldIndex(object):
+    """Requested keys compiled into lookup sets. A key matches its own
+    line, and every ``key::sub`` line of a vector or histogram stat."""
+    def __init__(self, keys):
+        self.keys = frozenset(keys)
+
+    def match(self, name):
+        """(key, sub) for a stat name, or None if it was not requested.
+        sub is None for scalar lines."""
+        if name in self.keys:
+            return name, None
+        base, sep, sub = name.partition('::')
+        if sep and base in self.keys:
+            return base, sub
+        return None
+
+def parse_value(token):
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+def _lines(source):
+    # a path, or anything that iterates over lines (an open file, a list)
+    if isinstance(source, str):
+        with open(source) as f:
+            for line in f:
+                yield line
+    else:
+        for line in source:
+            if isinstance(line, bytes):
+                line = line.decode()
+            yield line
+
+def iter_blocks(source, keys=None, stop_early=False):
+    """
+    Yield one {key: value} dict per Begin/End block of a stats.txt.
+
+    With keys=None every stat is kept. With stop_early, reading stops
+    after the first block as soon as every key in keys has been seen.
+    """
+    index = FieldIndex(keys) if keys is not None else None
+    wanted = len(index.keys) if index else None
+    block = None
+    open_vector = None
+    for line in _lines(source):
+        if block is None:
+            if line.startswith(BEGIN_MARK):
+                block = {}
+                open_vector = None
+            continue
+        if line.startswith(END_MARK):
+            yield block
+            if stop_early:
+                return
+            block = None
+            continue
+        name, sep, rest = line.partition(' ')
+        if not sep:
+            continue
+        if index is None:
+            base, sep, sub = name.partition('::')
+            matched = (base, sub) if sep else (name, None)
+        else:
+            matched = index.match(name)
+        if matched is None:
+            # a vector is complete once a line of another stat follows it
+            if stop_early and open_vector is not None:
+                open_vector = None
+                if len(block) == wanted:
+                    yield block
+                    return
+            continue
+        key, sub = matched
+        value = parse_value(rest.split(None, 1)[0])
+        if sub is None:
+            block[key] = value
+            if stop_early and len(block) == wanted and open_vector is None:
+                yield block
+                return
+        else:
+            block.setdefault(key, {})[sub] = value
+            open_vector = key
+
+def read_stats(source, keys=None, block=0):
+    """Stats of one block (the first by default, -1 for the last)."""
+    if block == 0:
+        for stats in iter_blocks(source, keys, stop_early=keys is not None):
+            return stats
+        return {}
+    blocks = list(iter_blocks(source, keys))
+    return blocks[block] if blocks else {}
+
+def read_run_stats(source, keys):
+    """
+    Stats of the whole run of a stats.txt. With a single block that is
+    read_stats. A periodic run (--stats_period) has one block per period,
+    each after a stats reset: its integer stats are counters and are
+    summed over the blocks, as are the ADDITIVE ones, and the RATIOS are
+    recomputed from the summed counters. Other stats (rates, miss ratios,
+    vectors) have no whole-run value there and are left out.
+    """
+    keys = list(keys)
+    counters = set(keys)
+    for key in keys:
+        counters.update(RATIOS.get(key, ()))
+    blocks = list(iter_blocks(source, counters))
+    if len(blocks) < 2:
+        stats = blocks[0] if blocks else {}
+        return {key: stats[key] for key in keys if key in stats}
+    totals = {}
+    for key in counters:
+        values = [block.get(key) for block in blocks]
+        if all(isinstance(v, int) for v in values) or (
+                key in ADDITIVE and all(isinstance(v, (int, float)) for v in values)):
+            totals[key] = sum(values)
+    for key, (numerator, denominator) in RATIOS.items():
+        if key in keys and numerator in totals and totals.get(denominator):
+            totals[key] = totals[numerator] / totals[denominator]
+    return {key: totals[key] for key in keys if key in totals}
+
+def read_config(source, fields):
+    """
+    {(section, option): value} for the requested fields of a config.ini,
+    stopping as soon as all of them were found. Values are strings, as with
+    ConfigParser.
+    """
+    wanted = set(fields)
+    found = {}
+    section = None
+    for line in _lines(source):
+        if line.startswith('['):
+            section = line.strip()[1:-1]
+            continue
+        option, sep, value = line.partition('=')
+        if sep and (section, option) in wanted:
+            found[(section, option)] = value.rstrip('\n')
+            if len(found) == len(wanted):
+                break
+    return found
+
+def to_arrays(blocks, keys):
+    """
+    {key: ndarray} over a list of blocks. Scalars give one value per block
+    (int64 if every value is an int, float64 with NaN for missing values
+    otherwise). Vectors and histograms give a (blocks, subs) float64 array
+    whose column labels are stored under key + '::subs'.
+    """
+    # numpy is only needed here, on the analysis side
+    import numpy as np
+
+    arrays = {}
+    for key in keys:
+        values = [block.get(key) for block in blocks]
+        if any(isinstance(v, dict) for v in values):
+            subs = []
+            for v in values:
+                for sub in (v or {}):
+                    if sub not in subs:
+                        subs.append(sub)
+            table = np.full((len(values), len(subs)), np.nan)
+            for row, v in enumerate(values):
+                for col, sub in enumerate(subs):
+                    if v and sub in v:
+                        table[row, col] = v[sub]
+            arrays[key] = table
+            arrays[key + '::subs'] = np.array(subs)
+        elif values and all(isinstance(v, int) for v in values):
+            arrays[key] = np.array(values, dtype=np.int64)
+        else:
+            arrays[key] = np.array([np.nan if v is None else v for v in values],
+                                   dtype=np.float64)
+    return arrays
@@ -0,0 +1,190 @@
+"""
+Sweep specifications for --test.
+
+A sweep spec is a JSON file that names any Options fields as axes. Jobs are
+generated lazily, one at a time, as the Cartesian product of the axes, so a
+million-point grid is never materialized in memory. Example:
+
+    {
+      "fixed": {"cmd": "./blocked-matmul"},
+      "grids": [
+        {
+          "axes": {
+            "l1d_size": ["8kB", "16kB", "32kB"],
+            "l1d_assoc": [2, 4],
+            "branch_predictor": ["local", "tourn", "bi"],
+            "options": ["50 50 50", "100 100 100"]
+          },
+          "exclude": [{"l1d_size": "8kB", "options": "100 100 100"}]
+        },
+        {
+          "fixed": {"cmd": "./queens"},
+          "axes": {
+            "options": ["-c 8", "-c 10"],
+            "l1i_size": ["16kB", "32kB"],
+            "l1d_size": ["32kB", "64kB"]
+          },
+          "zip": [["l1i_size", "l1d_size"]]
+        }
+      ]
+    }
+
+- "fixed" settings apply to every job (a grid's own "fixed" wins).
+- "axes" maps a field to its values. A value can also be a dict that sets
+  several fields at once, e.g. {"l1d_size": "32kB", "l1d_assoc": 8}.
+- "zip" lists groups of axes that advance together instead of being
+  crossed; they must have the same number of values.
+- "exclude" drops every job whose settings match one of the partial
+  settings given.
+- A spec without "grids" is a single grid.
+- "args" is a template for the program arguments (the "options" field)
+  whose {names} are taken from axes or fixed settings of the same name,
+  so every binary can have its own arguments and parameters:
+
+    {
+      "grids": [
+        {
+          "fixed": {"cmd": "./blocked-matmul"},
+          "args": "{I} {J} {K}",
+          "axes": {"l1d_size": ["8kB", "16kB"],
+                   "matrix": [{"I": 50, "J": 50, "K": 50},
+                              {"I": 128, "J": 50, "K": 20}]}
+        },
+        {
+          "fixed": {"cmd": "./queens"},
+          "args": "-c {n}",
+          "axes": {"l1d_size": ["8kB", "16kB"], "n": [8, 10]}
+        }
+      ]
+    }
+
+  Template parameters are not Options fields and are left out of the job
+  settings; "exclude" can still refer to them.
+- Jobs of several grids are interleaved round robin, so a sweep over
+  several binaries keeps all of them moving.
+
+Both formats can also list job keys under "skip" (never run) and "defer"
+(run after every other job); cache_model.py fills them in.
+
+The old tests.json format (Cache_size, Predictor, Matrix_size) is still
+read by legacy_jobs, with its original "done" keys.
+"""
+import collections
+import itertools
+import string
+
+# key: string identifying the job in the progress file
+# settings: {Options field: value}
+Job = collections.namedtuple('Job', ['key', 'settings'])
+
+def is_spec(tests):
+    return 'axes' in tests or 'grids' in tests
+
+def job_key(settings):
+    return " ".join("%s=%s" % (name, settings[name]) for name in sorted(settings))
+
+def _as_settings(name, value):
+    if isinstance(value, dict):
+        return value
+    return {name: value}
+
+def _dimensions(grid):
+    """One list of partial settings per independent dimension of the grid."""
+    axes = grid.get('axes', {})
+    zipped = grid.get('zip', [])
+    in_zip = set(name for group in zipped for name in group)
+    dimensions = []
+    for name, values in axes.items():
+        if name not in in_zip:
+            dimensions.append([_as_settings(name, v) for v in values])
+    for group in zipped:
+        lengths = set(len(axes[name]) for name in group)
+        if len(lengths) != 1:
+            raise ValueError("zipped axes %s have different lengths" % ", ".join(group))
+        dimension = []
+        for values in zip(*[axes[name] for name in group]):
+            settings = {}
+            for name, value in zip(group, values):
+                settings.update(_as_settings(name, value))
+            dimension.append(settings)
+        dimensions.append(dimension)
+    return dimensions
+
+def _matches(settings, partial):
+    return all(settings.get(name) == value for name, value in partial.items())
+
+def template_fields(template):
+    return [name for text, name, spec, conversion in string.Formatter().parse(template)
+            if name]
+
+def grid_jobs(grid, fixed=None, args=None):
+    fixed = dict(fixed or {}, **grid.get('fixed', {}))
+    exclude = grid.get('exclude', [])
+    args = grid.get('args', args)
+    params = template_fields(args) if args else []
+    for combination in itertools.product(*_dimensions(grid)):
+        settings = dict(fixed)
+        for partial in combination:
+            settings.update(partial)
+        if any(_matches(settings, partial) for partial in exclude):
+            continue
+        if args:
+            values = {name: settings.pop(name) for name in params}
+            settings['options'] = args.format(**values)
+        yield Job(job_key(settings), settings)
+
+def iter_jobs(spec):
+    """Lazily generate every job of a sweep spec, taking one job of each
+    grid in turn."""
+    fixed = spec.get('fixed', {})
+    streams = [grid_jobs(grid, fixed, spec.get('args'))
+               for grid in spec.get('grids', [spec])]
+    while streams:
+        for stream in list(streams):
+            try:
+                yield next(stream)
+            except StopIteration:
+                streams.remove(stream)
+
+def count_jobs(spec):
+    """Number of jobs of a spec, without keeping them in memory. Grids
+    without exclusions are counted without generating their jobs."""
+    total = 0
+    fixed = spec.get('fixed', {})
+    for grid in spec.get('grids', [spec]):
+        if grid.get('exclude'):
+            total += sum(1 for job in grid_jobs(grid, fixed, spec.get('args')))
+            continue
+        count = 1
+        for dimension in _dimensions(grid):
+            count *= len(dimension)
+        total += count
+    return total
+
+def legacy_jobs(tests):
+    """Jobs of an old style tests.json, keyed like its "done" list."""
+    for c in tests["Cache_size"]:
+        for p in tests["Predictor"]:
+            for m in tests["Matrix_size"]:
+                UUID = "l1d:" + str(c) + " BP:" + p + " M:" + str(m["I"]) + "," + str(m["J"]) + "," + str(m["K"])
+                yield Job(UUID, {"l1d_size": str(c) + "kB",
+                                 "branch_predictor": p,
+                                 "options": str(m["I"]) + " " + str(m["J"]) + " " + str(m["K"])})
+
+def legacy_count(tests):
+    return len(tests["Cache_size"]) * len(tests["Predictor"]) * len(tests["Matrix_size"])
+
+def load_jobs(tests):
+    """(job stream, total) for either format, without the skipped jobs."""
+    if is_spec(tests):
+        jobs, total = iter_jobs(tests), count_jobs(tests)
+    else:
+        jobs, total = legacy_jobs(tests), legacy_count(tests)
+    skip = set(tests.get('skip', []))
+    if skip:
+        jobs = (job for job in jobs if job.key not in skip)
+        total -= len(skip)
+    return jobs, total
+
+def deferred_keys(tests):
+    return set(tests.get('defer', []))
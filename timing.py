@@ -0,0 +1,163 @@
+"""
+Cost of every simulation of a sweep, and a report of where the time goes.
+
+Each simulation child writes timing.json (seconds spent in instantiate and
+in simulate) to its directory. When the parent reaps the child it appends
+one JSON line to <directory>/metrics.jsonl with the job key and settings,
+wall time, user/sys CPU time and peak RSS of the child (from wait4), the
+child-side timings and the simulated instructions.
+
+Usage:
+    python3 timing.py output-directory [--top N]
+
+prints the totals, the sweep axes ranked by how much they change the cost
+of a run, the slowest runs and the runs that simulate much slower than the
+rest.
+"""
+import argparse
+import fcntl
+import json
+import os
+import statistics
+import sys
+import time
+
+import stats_reader
+
+TIMING_FILE = 'timing.json'
+METRICS_FILE = 'metrics.jsonl'
+
+RUN_STATS = ['sim_insts', 'sim_ticks']
+
+class PhaseTimer(object):
+    """Wall time of the named phases of a simulation, saved to TIMING_FILE."""
+    def __init__(self):
+        self.phases = {}
+        self.started = {}
+
+    def start(self, name):
+        self.started[name] = time.time()
+
+    def stop(self, name):
+        elapsed = time.time() - self.started.pop(name)
+        self.phases[name + '_s'] = self.phases.get(name + '_s', 0.0) + elapsed
+
+    def save(self, the_dir):
+        with open(os.path.join(the_dir, TIMING_FILE), 'w') as outfile:
+            json.dump(self.phases, outfile)
+
+def append_record(path, record):
+    """Append one JSON line to path; safe with several writers."""
+    data = json.dumps(record, sort_keys=True).encode() + b'\n'
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+def run_record(the_dir, exit_status, rusage, wall):
+    """Parent-side measurements of one finished simulation child."""
+    record = {'dir': the_dir,
+              'exit_status': exit_status,
+              'wall_s': wall,
+              'user_s': rusage.ru_utime,
+              'sys_s': rusage.ru_stime,
+              # kilobytes on Linux
+              'max_rss_kb': rusage.ru_maxrss}
+    timing_path = os.path.join(the_dir, TIMING_FILE)
+    if os.path.exists(timing_path):
+        with open(timing_path) as timing_file:
+            record.update(json.load(timing_file))
+    sampling_path = os.path.join(the_dir, 'sampling.json')
+    stats_path = os.path.join(the_dir, 'stats.txt')
+    if os.path.exists(sampling_path):
+        # stats.txt only holds the windows
+        with open(sampling_path) as sampling_file:
+            record['sim_insts'] = json.load(sampling_file).get('total_insts')
+    elif os.path.exists(stats_path):
+        # summed over the periods of a --stats_period run
+        record.update(stats_reader.read_run_stats(stats_path, RUN_STATS))
+    if record.get('sim_insts') and record.get('simulate_s'):
+        record['insts_per_s'] = record['sim_insts'] / record['simulate_s']
+    return record
+
+def load_records(directory):
+    records = []
+    with open(os.path.join(directory, METRICS_FILE)) as metrics_file:
+        for line in metrics_file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+def axis_costs(records):
+    """
+    [(axis, spread, [(value, runs, mean wall, share of total wall)])] for
+    every setting that takes more than one value, most expensive axis
+    (largest ratio between the slowest and fastest value) first.
+    """
+    total = sum(r['wall_s'] for r in records) or 1.0
+    by_axis = {}
+    for r in records:
+        for axis, value in r.get('settings', {}).items():
+            by_axis.setdefault(axis, {}).setdefault(str(value), []).append(r['wall_s'])
+    axes = []
+    for axis, values in by_axis.items():
+        if len(values) < 2:
+            continue
+        rows = sorted(((value, len(walls), statistics.mean(walls), sum(walls) / total)
+                       for value, walls in values.items()),
+                      key=lambda row: -row[2])
+        fastest = rows[-1][2]
+        spread = rows[0][2] / fastest if fastest else float('inf')
+        axes.append((axis, spread, rows))
+    axes.sort(key=lambda axis: -axis[1])
+    return axes
+
+def slow_runs(records, factor=3.0):
+    """Runs that simulate more than factor times slower than the median."""
+    rates = [r['insts_per_s'] for r in records if r.get('insts_per_s')]
+    if not rates:
+        return []
+    median = statistics.median(rates)
+    return [r for r in records if r.get('insts_per_s') and r['insts_per_s'] * factor < median]
+
+def describe(record):
+    return record.get('key') or record['dir']
+
+def report(records, top=10, out=sys.stdout):
+    wall = sum(r['wall_s'] for r in records)
+    cpu = sum(r['user_s'] + r['sys_s'] for r in records)
+    insts = sum(r.get('sim_insts') or 0 for r in records)
+    failed = sum(1 for r in records if r.get('exit_status'))
+    out.write("%d runs (%d failed): %.1f h wall, %.1f h CPU, %.3g simulated instructions\n"
+              % (len(records), failed, wall / 3600, cpu / 3600, insts))
+    out.write("peak RSS %.0f MB\n" % (max(r['max_rss_kb'] for r in records) / 1024.0))
+    for axis, spread, rows in axis_costs(records):
+        out.write("\n%s (slowest/fastest %.2fx)\n" % (axis, spread))
+        for value, runs, mean, share in rows:
+            out.write("  %-24s %5d runs %10.1f s/run %6.1f%%\n" % (value, runs, mean, 100 * share))
+    out.write("\nslowest runs\n")
+    for r in sorted(records, key=lambda r: -r['wall_s'])[:top]:
+        out.write("  %10.1f s %8.0f MB  %s\n" % (r['wall_s'], r['max_rss_kb'] / 1024.0, describe(r)))
+    slow = slow_runs(records)
+    if slow:
+        out.write("\nruns simulating >3x slower than the median\n")
+        for r in sorted(slow, key=lambda r: r['insts_per_s']):
+            out.write("  %10.0f inst/s  %s\n" % (r['insts_per_s'], describe(r)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the cost of the simulations of a sweep")
+    parser.add_argument('directory', help="output directory of gem5script.py")
+    parser.add_argument('--top', type=int, default=10, help="number of slowest runs to list")
+    args = parser.parse_args()
+    path = os.path.join(args.directory, METRICS_FILE)
+    records = load_records(args.directory) if os.path.exists(path) else []
+    if not records:
+        sys.exit("no runs in %s" % path)
+    report(records, args.top)
+
+if __name__ == '__main__':
+    main()
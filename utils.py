@@ -1,5 +1,27 @@
+import json
+import os
+import re
 import sys
 
 def eprint(*args):
     sys.stderr.write("".join(args))
     sys.stderr.write("\n")
+
+
+def write_json_atomic(path, data):
+    """Write data as JSON to path so readers never see a partial file."""
+    tmp_path = "%s.tmp.%d" % (path, os.getpid())
+    with open(tmp_path, 'w') as outfile:
+        json.dump(data, outfile)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(tmp_path, path)
+
+
+def size_bytes(size):
+    """'32kB' -> 32768"""
+    match = re.match(r'^(\d+)\s*([kKmM]?)i?B?$', str(size))
+    if not match:
+        raise ValueError("can't parse size %r" % size)
+    number, unit = match.groups()
+    return int(number) * {'': 1, 'k': 1024, 'K': 1024, 'm': 1024 ** 2, 'M': 1024 ** 2}[unit]
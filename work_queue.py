@@ -0,0 +1,159 @@
+"""
+Work queue in a shared directory, for sweeps spread over several hosts.
+
+A coordinator publishes one file per job in <queue>/pending. Workers claim
+a job by renaming its file into <queue>/leased, with their worker id
+appended to the name; rename is atomic (also on NFS), so exactly one
+worker wins each job. While the simulation runs the worker touches its
+lease file every few seconds. A lease whose file has not been touched for
+lease_timeout seconds belongs to a dead worker and anybody may move it
+back to pending. Finished jobs are written to <queue>/done with the
+result directory, which is how the coordinator learns about them.
+
+Only plain files and renames are used, so the queue works on any shared
+filesystem and with any number of worker processes on one box.
+"""
+import hashlib
+import json
+import os
+import socket
+import time
+
+from utils import write_json_atomic
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+# present once the coordinator queued every job
+PUBLISHED = 'published'
+
+def worker_id():
+    return "%s-%d" % (socket.gethostname(), os.getpid())
+
+def job_name(seq, key):
+    """Queue file of a job; jobs are claimed in seq order."""
+    return "%08d-%s.json" % (seq, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+class Lease(object):
+    def __init__(self, name, path, job):
+        self.name = name
+        self.path = path
+        self.job = job
+        self.last_beat = time.time()
+        # set once it expired and was reclaimed
+        self.lost = False
+
+class WorkQueue(object):
+    def __init__(self, path):
+        self.path = path
+        for state in [PENDING, LEASED, DONE]:
+            os.makedirs(os.path.join(path, state), exist_ok=True)
+
+    def _dir(self, state):
+        return os.path.join(self.path, state)
+
+    def _names(self, state):
+        return sorted(name for name in os.listdir(self._dir(state)) if name.endswith('.json'))
+
+    def _leases(self):
+        """{job name: lease file name} of every leased job."""
+        return {name.split('.json.')[0] + '.json': name
+                for name in os.listdir(self._dir(LEASED)) if '.json.' in name}
+
+    def start_publishing(self):
+        if os.path.exists(os.path.join(self.path, PUBLISHED)):
+            os.unlink(os.path.join(self.path, PUBLISHED))
+
+    def finish_publishing(self):
+        open(os.path.join(self.path, PUBLISHED), 'w').close()
+
+    def drained(self):
+        """True once every job was published and none is pending or
+        leased."""
+        return (os.path.exists(os.path.join(self.path, PUBLISHED)) and
+                not self._names(PENDING) and not self._leases())
+
+    def publish(self, seq, key, settings, options=None):
+        """Queue a job unless it is already queued or running. options
+        are the coordinator's, which the worker runs the settings of the
+        job on. The coordinator only publishes jobs it wants (re)run, so a
+        result of the job left in done by an earlier sweep is dropped."""
+        name = job_name(seq, key)
+        try:
+            os.unlink(os.path.join(self._dir(DONE), name))
+        except FileNotFoundError:
+            pass
+        if (os.path.exists(os.path.join(self._dir(PENDING), name)) or
+                name in self._leases()):
+            return False
+        write_json_atomic(os.path.join(self._dir(PENDING), name),
+                          {'key': key, 'settings': settings, 'options': options or {}})
+        return True
+
+    def claim(self, worker):
+        """Lease the first pending job, or None if there is none."""
+        for name in self._names(PENDING):
+            lease_path = os.path.join(self._dir(LEASED), name + '.' + worker)
+            try:
+                os.rename(os.path.join(self._dir(PENDING), name), lease_path)
+            except FileNotFoundError:
+                continue # claimed by somebody else
+            # the mtime of the lease file is its heartbeat
+            os.utime(lease_path)
+            with open(lease_path) as f:
+                return Lease(name, lease_path, json.load(f))
+        return None
+
+    def heartbeat(self, lease):
+        """Renew lease. False if it expired and was reclaimed."""
+        try:
+            os.utime(lease.path)
+        except FileNotFoundError:
+            lease.lost = True
+            return False
+        lease.last_beat = time.time()
+        return True
+
+    def complete(self, lease, result):
+        """Record the result of a leased job and release the lease."""
+        record = dict(lease.job, **result)
+        write_json_atomic(os.path.join(self._dir(DONE), lease.name), record)
+        for path in [lease.path, os.path.join(self._dir(PENDING), lease.name)]:
+            # the job may have been reclaimed while we finished it
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def reclaim(self, lease_timeout):
+        """Move leases not renewed for lease_timeout seconds back to
+        pending. Returns the number of jobs reclaimed."""
+        reclaimed = 0
+        now = time.time()
+        for name, lease_name in self._leases().items():
+            lease_path = os.path.join(self._dir(LEASED), lease_name)
+            try:
+                if os.stat(lease_path).st_mtime > now - lease_timeout:
+                    continue
+                os.rename(lease_path, os.path.join(self._dir(PENDING), name))
+            except FileNotFoundError:
+                continue # completed or reclaimed meanwhile
+            reclaimed += 1
+        return reclaimed
+
+    def new_results(self, seen, names=None):
+        """Records of the finished jobs whose names are not in the set
+        seen, which is updated; only those in names if given."""
+        records = []
+        for name in self._names(DONE):
+            if name in seen or (names is not None and name not in names):
+                continue
+            with open(os.path.join(self._dir(DONE), name)) as f:
+                records.append(json.load(f))
+            seen.add(name)
+        return records
+
+    def counts(self):
+        return {PENDING: len(self._names(PENDING)),
+                LEASED: len(self._leases()),
+                DONE: len(self._names(DONE))}